@@ -0,0 +1,68 @@
+"""
+Compares LevelParser against the old eval() loading.
+Run from the repo root with: python -m benchmarks.parser
+"""
+
+import re
+import time
+
+import geo
+from geo import LevelParser
+
+LEVEL = "levels/radioanger.level"
+SYNTHETIC_SIZE = 1024 * 1024
+
+def read_code(path):
+    with open(path, "r") as f:
+        f.readline() # name
+        return f.read()
+
+def synthetic_level(code, size):
+    # repeats the level further and further to the right until it's big enough
+    objs = re.findall(r"\w+\(.*?\)\)?(?=, \w+\(|\]$)", code.strip())
+    width = 20000
+    out = []
+    total = 0
+    copy = 0
+    while total < size:
+        for o in objs:
+            o = re.sub(r"Vector2\((-?[\d.e+-]+), ", lambda m: f"Vector2({float(m.group(1)) + copy * width}, ", o, count=1)
+            out.append(o)
+            total += len(o) + 2
+        copy += 1
+    return "[" + ", ".join(out) + "]"
+
+def best_of(func, runs):
+    times = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+def bench(label, code, runs):
+    env = vars(geo)
+    specs = LevelParser(code).parse()
+    assert repr(eval(code, env)) == repr(LevelParser.instantiate(specs))
+
+    print(f"{label}: {len(code) / 1024:.0f} KiB, {len(specs)} objects (best of {runs})")
+    rows = [
+        ("eval", lambda: eval(code, env)),
+        ("compile (eval without objects)", lambda: compile(code, label, "eval")),
+        ("LevelParser.parse", lambda: LevelParser(code).parse()),
+        ("LevelParser.load", lambda: LevelParser.load(code)),
+        ("instantiate (cached specs)", lambda: LevelParser.instantiate(specs)),
+    ]
+    base = None
+    for name, func in rows:
+        t = best_of(func, runs)
+        base = base or t
+        print(f"  {name:<32}{t * 1000:9.2f} ms  {base / t:5.2f}x")
+
+def main():
+    code = read_code(LEVEL)
+    bench(LEVEL, code, 20)
+    bench("synthetic", synthetic_level(code, SYNTHETIC_SIZE), 3)
+
+if __name__ == "__main__":
+    main()
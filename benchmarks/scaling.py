@@ -0,0 +1,77 @@
+"""
+How the game's costs grow with the size of a level, using StressLevel.
+Run from the repo root with: python -m benchmarks.scaling [--counts=1000,10000,100000] [--density=250]
+
+For every object count it times generating & instantiating the objects, Game.make(), find_by_tag(),
+build_visible() and a whole tick, all with every object in memory (nothing is streamed). The last column
+is how much the time grew against the previous count divided by how much the count grew, so ~1 is linear
+and anything well above it is worse.
+"""
+
+import time
+
+from pyray import Camera2D, Vector2
+
+import geo
+from geo import Game, InputFrame, LevelParser, SimulationThread, StressLevel, arg_value
+from benchmarks.parser import best_of
+
+COUNTS = "1000,10000,100000"
+RUNS = 3
+TICKS = 60
+
+def new_game():
+    geo.game = g = Game()
+    g.camera = Camera2D(Vector2(geo.screen_width // 2, geo.screen_height // 2), Vector2(0, 0), 0, 1)
+    return g
+
+def measure(count, density):
+    # {step: seconds}
+    times = {}
+    start = time.perf_counter()
+    specs = StressLevel.generate(count, density)
+    times["generate"] = time.perf_counter() - start
+    times["instantiate"] = best_of(lambda: LevelParser.instantiate(specs), RUNS)
+
+    def make(objs):
+        g = new_game()
+        g.make(objs)
+        g._call_deferred()
+        return g
+    made = []
+    for _ in range(RUNS):
+        objs = LevelParser.instantiate(specs)
+        start = time.perf_counter()
+        make(objs)
+        made.append(time.perf_counter() - start)
+    times["Game.make"] = min(made)
+
+    g = make(LevelParser.instantiate(specs))
+    times["find_by_tag"] = best_of(lambda: g.find_by_tag("Win"), RUNS)
+    times["build_visible"] = best_of(g.build_visible, RUNS)
+
+    sim = SimulationThread(g)
+    start = time.perf_counter()
+    for i in range(TICKS):
+        sim.tick(InputFrame(False, False, False, False, False, False, 0))
+    times["tick"] = (time.perf_counter() - start) / TICKS
+    g.reset()
+    return times
+
+def main():
+    counts = [int(c) for c in arg_value("--counts", COUNTS).split(",")]
+    density = int(arg_value("--density", StressLevel.DENSITY))
+
+    previous = None
+    for count in counts:
+        times = measure(count, density)
+        print(f"{count} objects, {density} per screen")
+        for step, t in times.items():
+            growth = ""
+            if previous is not None and previous[1][step] > 0:
+                growth = f"{(t / previous[1][step]) / (count / previous[0]):6.2f}"
+            print(f"  {step:<16}{t * 1000:10.3f} ms  {growth}")
+        previous = (count, times)
+
+if __name__ == "__main__":
+    main()
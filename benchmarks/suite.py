@@ -0,0 +1,235 @@
+"""
+Measures loading, simulation & drawing of every built in level and compares it against a saved baseline.
+Run from the repo root with:
+
+    python -m benchmarks.suite [levels ...] [--ticks=1200] [--runs=5] [--json=out.json] [--baseline=path] [--save-baseline]
+
+Levels are level files or Level classes, by default everything in levels/ plus TestLevel & BlankLevel.
+For each level it records the parse & instantiate time, set_level() and respawn time, headless ticks per second
+with the same replayed input every run, the peak Python memory while loading & playing and, when a window
+can be opened, how long drawing a frame into an offscreen texture takes.
+
+The results are printed and written as JSON with --json. With --save-baseline they become the new baseline
+(benchmarks/baseline.json unless --baseline says otherwise), otherwise they're compared against it and the
+exit code is 1 when anything got slower (or bigger) than THRESHOLDS allows, so it can run in CI. Baselines only
+mean something on the machine that made them, so none is checked in.
+"""
+
+import io
+import json
+import os
+import platform
+import sys
+import time
+import tracemalloc
+from contextlib import redirect_stdout
+
+from pyray import *
+
+import geo
+from geo import Draw, Game, InputFrame, Level, LevelCache, SimulationThread, arg_value
+from convert_levels import find_files
+from benchmarks.parser import best_of
+
+DEFAULT_LEVELS = ["levels", "TestLevel", "BlankLevel"]
+BASELINE = "benchmarks/baseline.json"
+TICKS = 1200
+MEMORY_TICKS = 120 # tracemalloc slows everything down a lot, a couple seconds of play is enough for the peak
+DRAW_FRAMES = 120
+RUNS = 5
+
+# how much worse than the baseline a metric may get before it counts as a regression, +1 means lower is better
+METRICS = {
+    "parse_ms": 1,
+    "instantiate_ms": 1,
+    "set_level_ms": 1,
+    "respawn_ms": 1,
+    "ticks_per_sec": -1,
+    "peak_kib": 1,
+    "draw_ms": 1,
+}
+THRESHOLDS = {"peak_kib": 0.10}
+DEFAULT_THRESHOLD = 0.20
+MIN_MS = 0.5 # anything faster than this is mostly timer noise, it's never a regression
+
+def replay_input(tick):
+    # the same jumps every run: hold jump for 3 ticks out of every 40, like tapping along to a level
+    step = tick % 40
+    return InputFrame(step < 3, step == 3, step < 3, False, False, False, 0)
+
+def find_levels(args):
+    levels = []
+    for arg in args:
+        if os.path.exists(arg):
+            for path in find_files([arg], ".level") + find_files([arg], geo.BinaryLevel.EXTENSION):
+                levels.append((path, lambda path=path: Level.from_file(path)))
+            continue
+        cls = getattr(geo, arg, None)
+        if not (isinstance(cls, type) and issubclass(cls, Level)):
+            print(f"'{arg}' isn't a level file, folder or Level class")
+            sys.exit(1)
+        levels.append((arg, cls))
+    return levels
+
+def new_game():
+    geo.game = g = Game()
+    g.camera = Camera2D(Vector2(geo.screen_width // 2, geo.screen_height // 2), Vector2(0, 0), 0, 1)
+    return g
+
+def play(g, lvl, ticks, frame=None):
+    # runs the level for a number of ticks with the replayed input, respawning like the death timer would.
+    # returns how many times the player died
+    sim = SimulationThread(g)
+    deaths = 0
+    with redirect_stdout(io.StringIO()): # the game prints every death
+        for i in range(ticks):
+            sim.tick(replay_input(i))
+            if frame is not None:
+                frame(sim.frames.latest()[0])
+            player = g.get_player()
+            if g.level is not lvl or player is None or player.dead:
+                deaths += player is not None and player.dead
+                g.set_level(lvl) # TimerObj uses get_time(), which doesn't run without a window
+    return deaths
+
+def measure(name, make_level, ticks, runs, target):
+    result = {"objects": 0, "parse_ms": None}
+    lvl = make_level()
+
+    if lvl.path is not None:
+        result["parse_ms"] = best_of(lambda: Level.read_file(lvl.path), runs) * 1000
+        LevelCache.get(lvl.path) # from here on the level is parsed once, like in the game
+    objs = lvl.get()
+    result["objects"] = len(objs)
+    result["instantiate_ms"] = best_of(lvl.get, runs) * 1000
+
+    g = new_game()
+    result["set_level_ms"] = best_of(lambda: g.set_level(lvl), runs) * 1000
+    result["respawn_ms"] = best_of(g.reload_level, runs) * 1000
+
+    g = new_game()
+    g.set_level(lvl)
+    start = time.perf_counter()
+    result["deaths"] = play(g, lvl, ticks)
+    result["ticks_per_sec"] = ticks / (time.perf_counter() - start)
+    g.reset()
+
+    tracemalloc.start()
+    g = new_game()
+    g.set_level(lvl)
+    play(g, lvl, MEMORY_TICKS)
+    result["peak_kib"] = tracemalloc.get_traced_memory()[1] / 1024
+    tracemalloc.stop()
+    g.reset()
+
+    result["draw_ms"] = None
+    if target is not None:
+        g = new_game()
+        g.set_level(lvl)
+        times = []
+        play(g, lvl, DRAW_FRAMES, lambda snapshot: times.append(draw_frame(target, snapshot)))
+        result["draw_ms"] = sorted(times)[len(times) // 2] * 1000
+        g.reset()
+
+    return result
+
+def open_target():
+    # a hidden window for the GL context, frames are drawn into a texture so nothing is ever shown
+    set_trace_log_level(TraceLogLevel.LOG_WARNING)
+    set_config_flags(ConfigFlags.FLAG_WINDOW_HIDDEN)
+    init_window(geo.screen_width, geo.screen_height, "benchmark")
+    if not is_window_ready():
+        set_trace_log_level(TraceLogLevel.LOG_ERROR) # every get_time() would warn about glfw otherwise
+        return None
+    return load_render_texture(geo.screen_width, geo.screen_height)
+
+def draw_frame(target, snapshot):
+    cam = Camera2D(Vector2(geo.screen_width // 2, geo.screen_height // 2), Vector2(*snapshot.cam_target), 0, 1)
+    start = time.perf_counter()
+    begin_texture_mode(target)
+    clear_background(BLACK)
+    begin_mode_2d(cam)
+    Draw.render(snapshot.cmds)
+    end_mode_2d()
+    end_texture_mode() # flushes the batch, so the GL calls are part of the time
+    return time.perf_counter() - start
+
+def compare(results, baseline):
+    # list of (level, metric, old, new) that got worse than allowed
+    regressions = []
+    for name, metrics in results.items():
+        old_metrics = baseline.get(name)
+        if old_metrics is None:
+            continue
+        for metric, sign in METRICS.items():
+            old, new = old_metrics.get(metric), metrics.get(metric)
+            if old is None or new is None:
+                continue
+            if metric.endswith("_ms") and max(old, new) < MIN_MS:
+                continue
+            allowed = THRESHOLDS.get(metric, DEFAULT_THRESHOLD)
+            if sign * (new - old) > allowed * old:
+                regressions.append((name, metric, old, new))
+    return regressions
+
+def fmt(value, digits=2):
+    return "-" if value is None else f"{value:.{digits}f}"
+
+def main():
+    ticks = int(arg_value("--ticks", TICKS))
+    runs = int(arg_value("--runs", RUNS))
+    out = arg_value("--json")
+    baseline_path = arg_value("--baseline", BASELINE)
+    args = [a for a in sys.argv[1:] if not a.startswith("--")]
+
+    target = open_target()
+    if target is None:
+        print("No window could be opened, draw times are skipped.")
+
+    print(f"{'level':<32}{'objects':>8}{'parse':>10}{'inst':>10}{'set':>10}{'respawn':>10}{'ticks/s':>10}{'deaths':>7}{'peak KiB':>10}{'draw':>8}")
+    results = {}
+    for name, make_level in find_levels(args or DEFAULT_LEVELS):
+        r = results[name] = measure(name, make_level, ticks, runs, target)
+        print(
+            f"{name:<32}{r['objects']:>8}{fmt(r['parse_ms']):>10}{fmt(r['instantiate_ms']):>10}{fmt(r['set_level_ms']):>10}"
+            f"{fmt(r['respawn_ms']):>10}{fmt(r['ticks_per_sec'], 0):>10}{r['deaths']:>7}{fmt(r['peak_kib'], 0):>10}{fmt(r['draw_ms']):>8}"
+        )
+    print("times in ms")
+
+    if target is not None:
+        unload_render_texture(target)
+        close_window()
+
+    report = {
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "ticks": ticks,
+        "levels": results,
+    }
+    if out is not None:
+        with open(out, "w") as f:
+            json.dump(report, f, indent=2)
+
+    if "--save-baseline" in sys.argv:
+        with open(baseline_path, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Saved the baseline to {baseline_path}")
+        return
+
+    if not os.path.exists(baseline_path):
+        print(f"No baseline at {baseline_path}, run with --save-baseline to make one.")
+        return
+    with open(baseline_path, "r") as f:
+        baseline = json.load(f)
+    if baseline.get("ticks") != ticks:
+        print(f"The baseline ran {baseline.get('ticks')} ticks, ticks per second may not compare.")
+
+    regressions = compare(results, baseline["levels"])
+    for name, metric, old, new in regressions:
+        print(f"REGRESSION {name} {metric}: {old:.2f} -> {new:.2f} ({(new - old) / old * 100:+.0f}%)")
+    if regressions:
+        sys.exit(1)
+    print(f"No regressions against {baseline_path}")
+
+if __name__ == "__main__":
+    main()
@@ -65,11 +65,20 @@ def copy_resources(src, dst):
     print("RESOURCE: All files copied.")
         
 
+def build_asset_pack(): # When this function is called, the current working directory should be set to DESTINATION
+    # imported here so the pack has exactly the texture sizes the game asks for
+    import geo
+
+    print("RESOURCE: Building asset pack ...")
+    count = geo.Assets.build_pack(geo.Assets.PACK)
+    print(f"RESOURCE: Packed {count} assets into {geo.Assets.PACK} ({os.path.getsize(geo.Assets.PACK) // 1024} KiB).")
+
 def get_relevant_files(): # When this function is called, the current working directory should be set to DESTINATION
     print(f"Working dir: {os.getcwd()}")
     files = []
     if plat == "Windows" or plat == "Linux":
         copy_resources("..", ".")
+        build_asset_pack()
         files += get_all_in_folder("./")
     else:
         # TODO since I am creating an app bundle, I shouldn't copy the resources all into it.
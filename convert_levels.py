@@ -0,0 +1,71 @@
+"""
+Converts levels between the text (.level) and binary (.glevel) formats.
+
+    python convert_levels.py binary [files or folders ...]
+    python convert_levels.py text [files or folders ...]
+
+With no paths it converts everything in levels/ and custom_levels/. The converted file is written
+next to the original and the load time of both versions is printed.
+"""
+
+import os
+import sys
+import time
+
+from geo import BinaryLevel, Level, LevelParser
+
+DEFAULT_FOLDERS = ["./levels", "./custom_levels"]
+
+def find_files(paths, extension):
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            for root, _, names in os.walk(path):
+                files += [os.path.join(root, n) for n in sorted(names) if os.path.splitext(n)[1] == extension]
+        elif os.path.splitext(path)[1] == extension:
+            files.append(path)
+    return files
+
+def time_load(path, runs=10):
+    best = None
+    for _ in range(runs):
+        start = time.perf_counter()
+        Level.read_file(path)
+        t = time.perf_counter() - start
+        best = t if best is None else min(best, t)
+    return best
+
+def write_text(path, name, specs):
+    with open(path, "w") as f:
+        f.write(name.strip() + "\n")
+        f.write(LevelParser.format(specs))
+
+def main():
+    if len(sys.argv) < 2 or sys.argv[1] not in ("binary", "text"):
+        print(__doc__)
+        sys.exit(1)
+
+    to_binary = sys.argv[1] == "binary"
+    source_ext, dest_ext = (".level", BinaryLevel.EXTENSION) if to_binary else (BinaryLevel.EXTENSION, ".level")
+    files = find_files(sys.argv[2:] or DEFAULT_FOLDERS, source_ext)
+    if not files:
+        print("No files to convert.")
+        return
+
+    print(f"{'file':<40}{'objects':>8}{'text':>10}{'binary':>10}{'text load':>12}{'binary load':>13}")
+    for src in files:
+        dest = os.path.splitext(src)[0] + dest_ext
+        name, specs = Level.read_file(src)
+        if to_binary:
+            BinaryLevel.write(dest, name, specs)
+        else:
+            write_text(dest, name, specs)
+
+        text, binary = (src, dest) if to_binary else (dest, src)
+        print(
+            f"{src:<40}{len(specs):>8}{os.path.getsize(text):>10}{os.path.getsize(binary):>10}"
+            f"{time_load(text) * 1000:>10.2f}ms{time_load(binary) * 1000:>11.2f}ms"
+        )
+
+if __name__ == "__main__":
+    main()
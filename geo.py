@@ -7,6 +7,9 @@ Created on Tue Nov 14 13:32:55 2023
 """
 
 import itertools as itert
+from collections import Counter, OrderedDict, deque, namedtuple
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+import multiprocessing
 from typing import Iterator
 
 from raylib import CheckCollisionRecs, Vector2Divide, Vector2Negate, Vector2Subtract
@@ -21,15 +24,85 @@ except ImportError:
 
 from pyray import *
 
+import ast
+import base64
+import bisect
+import functools
+import gc
+import hashlib
+import inspect
+import json
 import math
+import mmap
 import random
+import re
+import statistics
+import struct
 import sys
+import tempfile
+import threading
 import time
+import tracemalloc
 import os
+import zlib
 
 # base color is 127, 127, 127
 
+def arg_value(name, default=None): # for '--name=value' style options
+    for arg in sys.argv[1:]:
+        if arg.startswith(name + "="):
+            return arg[len(name)+1:]
+    return default
+
+def render_resolution(setting):
+    # (max size, scale) for WorldRenderTarget from --render-res, None (no render target) if it's missing or bad
+    if setting is None:
+        if "--render-res" in sys.argv:
+            setting = "" # given without '=', that's a usage mistake too
+        else:
+            return None
+    try:
+        if "x" in setting.lower():
+            w, h = setting.lower().split("x")
+            size = (int(w), int(h))
+            if min(size) > 0:
+                return size, None
+        else:
+            scale = float(setting)
+            if 0 < scale < math.inf:
+                return None, scale
+    except ValueError:
+        pass
+    sys.stderr.write(f"Ignoring --render-res '{setting}', use --render-res=WIDTHxHEIGHT (like 1280x720) or a scale of the window above 0 (like 0.5)\n")
+    return None
+
+def stream_ahead(setting, default):
+    # how far past the screen LevelStream builds chunks from --stream-ahead, the default if it's missing or bad
+    if setting is None:
+        if "--stream-ahead" not in sys.argv:
+            return default
+        setting = "" # given without '='
+    try:
+        ahead = float(setting)
+        if 0 <= ahead < math.inf:
+            return ahead
+    except ValueError:
+        pass
+    sys.stderr.write(f"Ignoring --stream-ahead '{setting}', use --stream-ahead=DISTANCE in world units 0 or above (like 3000)\n")
+    return default
+
+def read_umask():
+    # the only way to read the umask is to set it, which changes it for every thread, so it's only done once at import
+    umask = os.umask(0)
+    os.umask(umask)
+    return umask
+
 DEBUG_MODE = False
+THREADED_SIMULATION = "--threaded" in sys.argv # run the game logic on its own thread, see SimulationThread
+RENDER_RESOLUTION = render_resolution(arg_value("--render-res")) # 'WIDTHxHEIGHT' or a scale of the window like '0.5', see WorldRenderTarget
+
+STARTED = time.perf_counter() # for the cold start time
+LOGO_PATH = "textures/Geometry_Splash_Logo.png"
 
 screen_width = 1280
 screen_height = 720
@@ -42,17 +115,31 @@ def clamp(val, mi, ma):
     return m
 
 class Input:
+    JUMP_KEYS = (KeyboardKey(0).KEY_SPACE, KeyboardKey(0).KEY_UP, KeyboardKey(0).KEY_W)
+
+    _thread = threading.local() # .frame is set on the simulation thread, see InputFrame
+
+    @staticmethod
+    def _frame():
+        return getattr(Input._thread, "frame", None)
+
     @staticmethod
     def jump_pressed():
-        return is_key_pressed(KeyboardKey(0).KEY_SPACE) or is_key_pressed(KeyboardKey(0).KEY_UP) or is_mouse_button_pressed(0) or is_key_pressed(KeyboardKey(0).KEY_W)
+        if (frame := Input._frame()) is not None:
+            return frame.jump_pressed
+        return any(is_key_pressed(k) for k in Input.JUMP_KEYS) or is_mouse_button_pressed(0)
     
     @staticmethod
     def jump_released():
-        return is_key_released(KeyboardKey(0).KEY_SPACE) or is_key_released(KeyboardKey(0).KEY_UP) or is_mouse_button_released(0) or is_key_released(KeyboardKey(0).KEY_W)
+        if (frame := Input._frame()) is not None:
+            return frame.jump_released
+        return any(is_key_released(k) for k in Input.JUMP_KEYS) or is_mouse_button_released(0)
 
     @staticmethod
     def jump_down():
-        return is_key_down(KeyboardKey(0).KEY_SPACE) or is_key_down(KeyboardKey(0).KEY_UP) or is_mouse_button_down(0) or is_key_down(KeyboardKey(0).KEY_W)
+        if (frame := Input._frame()) is not None:
+            return frame.jump_down
+        return any(is_key_down(k) for k in Input.JUMP_KEYS) or is_mouse_button_down(0)
     
     @staticmethod
     def right_pressed():
@@ -64,7 +151,50 @@ class Input:
 
     @staticmethod
     def reset_level():
+        if (frame := Input._frame()) is not None:
+            return frame.reset
         return is_key_pressed(KeyboardKey(0).KEY_R)
+
+    @staticmethod
+    def back_released():
+        if (frame := Input._frame()) is not None:
+            return frame.back
+        return is_key_released(KeyboardKey(0).KEY_ESCAPE)
+
+    @staticmethod
+    def preview_toggled():
+        if (frame := Input._frame()) is not None:
+            return frame.preview
+        return is_key_pressed(KeyboardKey(0).KEY_T)
+
+class InputFrame(namedtuple("InputFrame", "jump_pressed jump_released jump_down reset back preview time")):
+    """
+    The input state of one rendered frame. raylib only polls input on the main thread (inside end_drawing()),
+    so when the simulation runs on its own thread the main thread samples one of these every frame and the
+    simulation consumes them through Input.
+    """
+
+    @staticmethod
+    def sample():
+        return InputFrame(
+            Input.jump_pressed(), Input.jump_released(), Input.jump_down(),
+            Input.reset_level(), Input.back_released(), Input.preview_toggled(),
+            time.perf_counter()
+        )
+
+    def has_edge(self):
+        return self.jump_pressed or self.jump_released or self.reset or self.back or self.preview
+
+    def merge(self, newer):
+        # edges are kept until the simulation consumes them, held state always comes from the newest frame
+        return InputFrame(
+            self.jump_pressed or newer.jump_pressed, self.jump_released or newer.jump_released, newer.jump_down,
+            self.reset or newer.reset, self.back or newer.back, self.preview or newer.preview,
+            self.time if self.has_edge() else newer.time
+        )
+
+    def held(self):
+        return InputFrame(False, False, self.jump_down, False, False, False, self.time)
     
 class Vec2i:
     def __init__(self, x, y):
@@ -153,32 +283,262 @@ class Rect:
     def __repr__(self):
         return f"Rect(pos=V2({self.position.x}, {self.position.y}), dim=V2({self.dimension.x}, {self.dimension.y}))"
 
+class Assets:
+    """
+    Textures (already resized to what the game asks for) & the built in levels, either from the pack
+    compile.py builds or from the loose files when developing. The pack is mmapped and images from it
+    point straight into the mapping, so nothing gets decoded or copied before going to the GPU.
+    Pack layout, little-endian: b"GEOPACK1", u32 entry count, then for each entry: u8 kind, u32 width,
+    u32 height, u64 offset, u64 size, u16 key length & the key, then the data (16 byte aligned).
+    """
+    PACK = "assets.pack"
+    MAGIC = b"GEOPACK1"
+    HEADER = struct.Struct("<8sI")
+    ENTRY = struct.Struct("<BIIQQH")
+    ALIGN = 16
+    IMAGE = 0 # RGBA8 pixels
+    LEVEL = 1 # a binary level
+
+    opens = 0 # asset files opened, for the startup report
+    _index = None # key -> (kind, width, height, offset, size)
+    _mm = None
+    _buffer = None
+    _lock = threading.Lock()
+
+    @staticmethod
+    def variants():
+        # every (path, width, height) the game loads, None means the image's own size
+        portals = (DefaultSpeedPortal, FastSpeedPortal, VeryFastSpeedPortal, FastestSpeedPortal)
+        return [
+            (Player.CUBE_SPRITE_PATH, Player.WIDTH, Player.HEIGHT),
+            (Player.CUBE_SPRITE_PATH, Player.WIDTH//2, Player.HEIGHT//2),
+            (Player.SHIP_SPRITE_PATH, Player.SHIP_WIDTH*2, Player.SHIP_HEIGHT*4),
+            (Player.BALL_SPRITE_PATH, Player.BALL_SIZE*2, Player.BALL_SIZE*2),
+            (LOGO_PATH, None, None),
+        ] + [(p.SPRITE_PATH, p.WIDTH, p.HEIGHT) for p in portals] + [(p, None, None) for p in BackgroundLoader.ID_MAP if p is not None]
+
+    @staticmethod
+    def image_key(path, width, height):
+        size = "native" if width is None else f"{width}x{height}"
+        return f"{os.path.normpath(path).replace(os.sep, '/')}@{size}"
+
+    @staticmethod
+    def level_key(path):
+        return os.path.normpath(path).replace(os.sep, "/")
+
+    @staticmethod
+    def pack():
+        with Assets._lock: # levels get loaded from the prefetch thread too
+            if Assets._index is None:
+                Assets._index = {}
+                if os.path.exists(Assets.PACK):
+                    Assets.open_pack(Assets.PACK)
+        return Assets._index
+
+    @staticmethod
+    def open_pack(path):
+        with open(path, "rb") as f:
+            Assets.opens += 1
+            mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, count = Assets.HEADER.unpack_from(mm, 0)
+        if magic != Assets.MAGIC:
+            sys.stderr.write(f"'{path}' isn't an asset pack, using loose files\n")
+            return
+
+        offset = Assets.HEADER.size
+        for _ in range(count):
+            kind, width, height, data_at, size, key_len = Assets.ENTRY.unpack_from(mm, offset)
+            offset += Assets.ENTRY.size
+            key = bytes(mm[offset:offset + key_len]).decode("utf-8")
+            offset += key_len
+            Assets._index[key] = (kind, width, height, data_at, size)
+        Assets._mm = mm
+        Assets._buffer = ffi.from_buffer(mm) # has to stay alive as long as images point into it
+
+    @staticmethod
+    def mode():
+        return "pack" if Assets._mm is not None else "loose files"
+
+    @staticmethod
+    def image(path, width=None, height=None):
+        """(image, owned), images that aren't owned point into the pack & must not be changed or unloaded."""
+        entry = Assets.pack().get(Assets.image_key(path, width, height))
+        if entry is not None:
+            _, w, h, data_at, _ = entry
+            data = ffi.cast("unsigned char *", Assets._buffer) + data_at
+            return Image(data, w, h, 1, PixelFormat.PIXELFORMAT_UNCOMPRESSED_R8G8B8A8), False
+
+        Assets.opens += 1
+        image = load_image(path)
+        if width is not None:
+            image_resize_nn(image, width, height)
+        return image, True
+
+    @staticmethod
+    def level(path):
+        """The binary version of a built in level as a memoryview into the pack, None when it isn't packed."""
+        entry = Assets.pack().get(Assets.level_key(path))
+        if entry is None:
+            return None
+        _, _, _, data_at, size = entry
+        return memoryview(Assets._mm)[data_at:data_at + size]
+
+    @staticmethod
+    def build_pack(out_path, level_folder="levels"):
+        entries = [] # (kind, width, height, key, data)
+        for path, width, height in Assets.variants():
+            image = load_image(path)
+            if width is not None:
+                image_resize_nn(image, width, height)
+            image_format(image, PixelFormat.PIXELFORMAT_UNCOMPRESSED_R8G8B8A8)
+            data = bytes(ffi.buffer(image.data, image.width * image.height * 4))
+            entries.append((Assets.IMAGE, image.width, image.height, Assets.image_key(path, width, height), data))
+            unload_image(image)
+
+        for file in sorted(os.listdir(level_folder)):
+            if os.path.splitext(file)[1] in (".level", BinaryLevel.EXTENSION):
+                path = os.path.join(level_folder, file)
+                entries.append((Assets.LEVEL, 0, 0, Assets.level_key(path), BinaryLevel.dump(*Level.read_file(path))))
+
+        keys = [e[3].encode("utf-8") for e in entries]
+        offset = Assets.HEADER.size + sum(Assets.ENTRY.size + len(k) for k in keys)
+        index = [Assets.HEADER.pack(Assets.MAGIC, len(entries))]
+        blobs = []
+        for (kind, width, height, _, data), key in zip(entries, keys):
+            padding = -offset % Assets.ALIGN
+            blobs.append(b"\0" * padding + data)
+            offset += padding
+            index.append(Assets.ENTRY.pack(kind, width, height, offset, len(data), len(key)) + key)
+            offset += len(data)
+
+        with open(out_path, "wb") as f:
+            f.write(b"".join(index + blobs))
+        return len(entries)
+
 class RaylibImage:
-    def __init__(self, image_path):
+    def __init__(self, image_path, width=None, height=None, writable=False):
         self.image_path = image_path
+        self.width = width # resized to this, see Assets
+        self.height = height
+        self.writable = writable # images from the pack are read only, this makes a copy if needed
         self.image = None
+        self.owned = False
     
     def __enter__(self):
-        self.image = load_image(self.image_path)
+        self.image, self.owned = Assets.image(self.image_path, self.width, self.height)
+        if self.writable and not self.owned:
+            self.image = image_copy(self.image)
+            self.owned = True
         return self.image
 
     def __exit__(self, *args):
-        if self.image is not None:
+        if self.image is not None and self.owned:
             unload_image(self.image)
-            self.image = None
+        self.image = None
+
+def new_vec(x, y):
+    # the same as Vector2(x, y), without pyray's checks for each field that make it ~6x slower
+    return ffi.new("Vector2 *", (x, y))[0]
 
 def clone_vec(vec):
-    return Vector2(vec.x, vec.y)
+    return new_vec(vec.x, vec.y)
+
+class GCPaused:
+    # turns the garbage collector off while thousands of objects are made at once, otherwise it keeps stopping
+    # to look through every object in the level again (about half the time of a big paste)
+    def __enter__(self):
+        self.was_enabled = gc.isenabled()
+        gc.disable()
+        return self
+
+    def __exit__(self, *args):
+        if self.was_enabled:
+            gc.enable()
+
+def color_tuple(color):
+    if isinstance(color, tuple):
+        return color
+    return (color.r, color.g, color.b, color.a)
+
+DrawCmd = namedtuple("DrawCmd", "shape x y color args rotation origin")
+
+class Draw:
+    """
+    Immutable draw lists. GameObj.draw_cmds() describes what draw() would do as plain tuples, which lets the
+    simulation thread hand a finished frame over to the main thread (the only one allowed to touch OpenGL).
+    """
+    RECT = 0            # args: (width, height)
+    TRIANGLE = 1        # args: the three points, x & y are unused
+    TRIANGLE_STRIP = 2  # args: the points, x & y are unused
+    TEXTURE = 3         # args: (getter, *getter_args), getter is called on the main thread
+    CIRCLE = 4          # args: (radius, border_color or None)
+    TEXT = 5            # args: (text, font_size)
+    LINE = 6            # args: (end_point, thickness)
+    BACKGROUND = 7      # args: (sprite_path, )
+
+    @staticmethod
+    def cmd(shape, x, y, color, *args, rotation=0, origin=None):
+        return DrawCmd(shape, x, y, color_tuple(color), args, rotation, origin)
+
+    @staticmethod
+    def render(cmds):
+        for cmd in cmds:
+            shape = cmd.shape
+            if cmd.origin is not None:
+                rl_push_matrix()
+                rl_translatef(cmd.origin[0], cmd.origin[1], 0)
+                rl_rotatef(cmd.rotation, 0, 0, -1)
+                rl_translatef(-cmd.origin[0], -cmd.origin[1], 0)
+
+            if shape == Draw.RECT:
+                draw_rectangle(int(cmd.x), int(cmd.y), int(cmd.args[0]), int(cmd.args[1]), cmd.color)
+            elif shape == Draw.TRIANGLE:
+                draw_triangle(cmd.args[0], cmd.args[1], cmd.args[2], cmd.color)
+            elif shape == Draw.TRIANGLE_STRIP:
+                draw_triangle_strip(cmd.args, len(cmd.args), cmd.color)
+            elif shape == Draw.TEXTURE:
+                draw_texture(cmd.args[0](*cmd.args[1:]), int(cmd.x), int(cmd.y), cmd.color)
+            elif shape == Draw.CIRCLE:
+                draw_circle(int(cmd.x), int(cmd.y), cmd.args[0], cmd.color)
+                if cmd.args[1] is not None:
+                    draw_circle_lines(int(cmd.x), int(cmd.y), cmd.args[0]+1, cmd.args[1])
+            elif shape == Draw.TEXT:
+                draw_text(cmd.args[0], int(cmd.x), int(cmd.y), cmd.args[1], cmd.color)
+            elif shape == Draw.LINE:
+                draw_line_ex((cmd.x, cmd.y), cmd.args[0], cmd.args[1], cmd.color)
+            elif shape == Draw.BACKGROUND:
+                sprite = BackgroundLoader.get_path_sprite(cmd.args[0])
+                for i in range(4):
+                    draw_texture_ex(sprite, (cmd.x + sprite.width*i, cmd.y), 0, 1, cmd.color)
+
+            if cmd.origin is not None:
+                rl_pop_matrix()
+
+class RenderLayer:
+    """Draw order, lowest first. Game keeps a list per layer that's updated as objects are made & destroyed."""
+    BACKGROUND = 0
+    WORLD = 1
+    HAZARDS = 2
+    PLAYER = 3
+    GROUND = 4
+    EDITOR_OVERLAY = 5
+    SCREEN_UI = 6 # drawn with ui_draw() outside of the camera
+
+    COUNT = 7
 
 class GameObj:
+    LAYER = RenderLayer.WORLD
+    STATELESS = False # True if playing never changes the object, then the editor's test play uses it without copying
+
     def __init__(self):
-        self.position = Vector2(0, 0)
+        self.position = new_vec(0, 0)
         self.area = None # Area should be of type Rect
         self.always_think = False
         self.rotation = 0
         self.origin = None
 
         self._predrawed = False
+        self._visible_frame = -1
     
     def clone(self):
         raise RuntimeError(f"Clone not supported for '{self.__class__}'")
@@ -204,9 +564,12 @@ class GameObj:
     
     def draw(self):
         pass
+
+    def draw_cmds(self, out):
+        pass # only needed for objects that can show up while the simulation thread is running, see Draw
     
     def is_ui_element(self):
-        return False
+        return self.LAYER == RenderLayer.SCREEN_UI
 
     def ui_draw(self):
         pass
@@ -218,11 +581,24 @@ class GameObj:
         pass
 
 class Game:
+    VISIBLE_THRESHOLD = 500
+    BULK_DESTROY = 16 # destroy() filters the lists once when given more objects than this
+
     def __init__(self):
         self.game_objects = []
+        self.layers = [[] for _ in range(RenderLayer.COUNT)]
+        self.frame = 0
         self.should_end = False
         self.level = None
+        self.level_frame = 0 # self.frame when the level was set
+        self.switch = None # (start time, level, prefetched) while waiting for a picked level to show up
+        self.stream = None # LevelStream of the current level, if it's streamed
+        self.watcher = None # LevelWatcher of the current level's file while it's played, the editor has its own
+        self.spatial = None # SpatialHash the editor keeps of every object with an area
+        self.zoom = 1 # on top of the zoom that scales to the window, the editor zooms out with it
+        self.overview = False # set by the editor when it draws a LevelLOD, then only always_think objects are visible
         self.player = None
+        self.no_player = False
         self.deferred = []
         self.camera = None
         self.editor_mode = False
@@ -270,11 +646,29 @@ class Game:
     def set_level(self, lvl):
         self.reset()
         self.level = lvl
-        self.make(lvl.get())
+        self.level_frame = self.frame
+        self.stream = None if self.editor_mode else lvl.stream()
+        self.watcher = None if self.editor_mode else LevelWatcher.start(lvl.path)
+        self.make(lvl.get() if self.stream is None else self.stream.start())
         if self.get_player() is not None:
             if self.get_player().orientation == -1:
                 self.get_player().flip_gravity()
+        if AllocStats.ENABLED:
+            AllocStats.level_loaded(self, lvl)
     
+    def start_level_switch(self, lvl, prefetched):
+        self.switch = (time.perf_counter(), lvl, prefetched)
+
+    def frame_presented(self, level, level_ticks):
+        # logs how long it took from picking a level on the level select to its first frame. What was shown
+        # comes from the frame that was drawn, with --threaded that's a FrameSnapshot & not the game itself
+        if self.switch is None:
+            return
+        started, lvl, prefetched = self.switch
+        if level is lvl and level_ticks > 0:
+            print(f"'{lvl.name}' playable after {(time.perf_counter() - started) * 1000:.1f} ms ({'prefetched' if prefetched else 'not prefetched'})")
+            self.switch = None
+
     def reload_level(self):
         assert self.level != None, "Attempted to reload level that is not loaded to begin with."
         self.set_level(self.level)
@@ -287,29 +681,78 @@ class Game:
         
     def make(self, objects):
         assert type(objects) is list, "make() method takes a list of game objects"
+        self.game_objects.extend(objects)
+        layers = self.layers
         for i in objects:
-            self.game_objects.append(i)
+            layers[i.LAYER].append(i)
+        if self.spatial is not None:
+            self.spatial.add_all(objects)
+        if self.no_player and any(type(i) is Player for i in objects):
+            self.no_player = False
         for i in objects: # Why? incase an object relies on the existence of another
             i.manifested()
     
     def destroy(self, objs):
         assert type(objs) is list, "destroy() method takes a list of game objects"
+        if len(objs) > Game.BULK_DESTROY:
+            self.destroy_bulk(objs)
+            return
         for i in objs:
             i.destroyed()
             self.game_objects.remove(i)
-    
+            self.layers[i.LAYER].remove(i)
+            if self.spatial is not None:
+                self.spatial.remove(i)
+    
+    def destroy_bulk(self, objs):
+        # one pass over the lists instead of searching them for every object
+        gone = set(objs)
+        for i in gone:
+            i.destroyed()
+        kept = [i for i in self.game_objects if i not in gone]
+        if len(kept) != len(self.game_objects) - len(gone):
+            raise ValueError("destroy() was given objects that aren't in the game")
+        self.game_objects[:] = kept
+        for layer in {i.LAYER for i in gone}:
+            self.layers[layer][:] = [i for i in self.layers[layer] if i not in gone]
+        if self.spatial is not None:
+            for i in gone:
+                self.spatial.remove(i)
+
+    def hot_reload(self, removed, added):
+        # puts the changes to the level's file into the running level, see LevelWatcher
+        gone = LevelWatcher.find(self.game_objects, removed)
+        if self.stream is not None:
+            made = self.stream.swap(self.watcher.specs, gone, added)
+            self.level.stream_index = None # dying starts the new version
+        else:
+            made = LevelParser.instantiate(added)
+        self.destroy(gone)
+        self.make(made)
+        print(f"Reloaded '{self.watcher.path}': {len(gone)} objects removed, {len(added)} added")
+
     def get_player(self):
-        if self.player == None:
+        if self.player == None and not self.no_player:
             self.player = self.find_by_tag("Player")
+            # remembered until a player is made, otherwise every object made in the editor searches the whole level
+            self.no_player = self.player is None
         return self.player
     
     def reset(self):
         self.player = None
+        self.no_player = False
         self.background = None
+        self.stream = None
+        self.watcher = None
+        self.spatial = None
+        self.zoom = 1
+        self.overview = False
         for obj in self.game_objects[:]:
             obj.destroyed()
 
         self.game_objects.clear()
+        for layer in self.layers:
+            layer.clear()
         get_game().reset_cam()
     
     def find_by_tag(self, name):
@@ -326,40 +769,1360 @@ class Game:
 
         return objs
 
-class Level:
-    CACHED_LEVEL = (None, None)
+    def build_visible(self):
+        if self.watcher is not None and (change := self.watcher.poll()) is not None:
+            self.hot_reload(*change)
+        if self.stream is not None:
+            self.stream.update(self)
+
+        cam = self.camera
+        self.frame += 1
+        frame = self.frame
+
+        half_width = screen_width / 2 / self.zoom
+        overview = self.overview
+        visible = []
+        for i in self.game_objects:
+            if i.always_think:
+                if isinstance(i, Background):
+                    self.background = i
+                else:
+                    visible.append(i)
+                    i._visible_frame = frame
+                continue
+            if overview:
+                continue
+            if i.position.x + Game.VISIBLE_THRESHOLD >= cam.target.x - half_width:
+                if cam.target.x + half_width >= i.position.x - Game.VISIBLE_THRESHOLD:
+                    visible.append(i)
+                    i._visible_frame = frame
+        return visible
+
+    def visible_in_layers(self, first, last):
+        """Objects from the last build_visible() in draw order, the background is drawn on its own."""
+        for layer in self.layers[first:last+1]:
+            for i in layer:
+                if i._visible_frame == self.frame:
+                    yield i
+
+    def run_logic(self, visible):
+        if self.background is not None:
+            self.background.logic()
+            
+        for i in visible:
+            i.logic()
+
+    def update_cam(self):
+        cam = self.camera
+        player = self.get_player()
+
+        if (freeze_loc := self.frozen_cam) is not None:
+            cam.target = VecMath.lerp(clone_vec(cam.target), clone_vec(freeze_loc), 0.3)
+
+        desired_cam_y_locked = False
+        if (freeze_y := self.frozen_y_cam) is not None:
+            desired_cam_y = lerp(cam.target.y, freeze_y, 0.3)
+            desired_cam_y_locked = True
+
+        if freeze_loc is None and player is not None:
+            if not desired_cam_y_locked:
+                desired_cam_y = lerp(cam.target.y, 0, 0.15)
+
+                if not player.halted and player.position.y < -200:
+                    desired_cam_y = lerp(cam.target.y, player.position.y+200, 0.15)
+
+            desired_cam_x = lerp(cam.target.x, player.position.x+200, 0.15)
+
+            if player.halted:
+                desired_cam_x = lerp(cam.target.x, self.find_by_tag("Win").position.x - 400, 0.3)
+            cam.target = Vector2(desired_cam_x, desired_cam_y)
+
+    def level_progress(self):
+        if (player := self.get_player()) is None:
+            return None
+        if (win := self.find_by_tag("Win")) is None:
+            return None
+        distance = abs(win.position.x - player.position.x)
+        return 100 - (distance / (win.position.x + 400)) * 100 # I added 400 cause the player starts -400 units back.
+
+    def can_simulate(self):
+        # only actual gameplay goes to the simulation thread, the editor & menus need raylib input every frame
+        return self.get_player() is not None and not self.editor_mode
+
+LevelSpec = namedtuple("LevelSpec", "type args") # one object of a parsed level, args are plain values
+V2 = namedtuple("V2", "x y") # a Vector2 argument, turned into a real Vector2 when the object is built
+
+class LevelParseError(ValueError):
+    def __init__(self, message, source, line, column):
+        super().__init__(f"{source}:{line}:{column}: {message}")
+        self.source = source
+        self.line = line
+        self.column = column
+
+class LevelParser:
+    """
+    Reads the repr format levels are saved in ('[Player(Vector2(-400.0, 0.0)), Ground(), ...]') without eval().
+    Only the types in LEVEL_TYPES can be built and the only values allowed are numbers, strings,
+    True/False/None, tuples and Vector2(x, y), so nothing in a level file can run code.
+    """
+    NUMBER = r"[-+]?(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?"
+    TOKENS = re.compile(rf"""\s*(?:
+        (?P<vector>Vector2\(\s*({NUMBER})\s*,\s*({NUMBER})\s*\)) # most values are vectors so they get one token
+      | (?P<number>{NUMBER})
+      | (?P<name>[A-Za-z_]\w*)
+      | (?P<string>'[^'\\\n]*(?:\\.[^'\\\n]*)*'|"[^"\\\n]*(?:\\.[^"\\\n]*)*")
+      | (?P<punct>[\[\](),])
+      | (?P<end>$)
+      | (?P<bad>.)
+    )""", re.VERBOSE)
+    CONSTANTS = {"True": True, "False": False, "None": None}
+    _ARITY = {} # type name -> (min args, max args)
+
+    def __init__(self, text, source="<level>", first_line=1):
+        self.text = text
+        self.source = source
+        self.first_line = first_line
+        self.tokens = [] # (kind, value, offset), values are already converted
+        self.i = 0
+
+        append = self.tokens.append
+        for m in LevelParser.TOKENS.finditer(text):
+            kind = m.lastgroup
+            if kind == "vector":
+                append((kind, V2(float(m.group(2)), float(m.group(3))), m.start(1)))
+            elif kind == "number":
+                tok = m.group(kind)
+                append((kind, float(tok) if "." in tok or "e" in tok or "E" in tok else int(tok), m.start(kind)))
+            elif kind == "bad":
+                self.error(f"unexpected character {m.group(kind)!r}", m.start(kind))
+            else:
+                append((kind, m.group(kind), m.start(kind)))
+                if kind == "end":
+                    break
 
-    def __init__(self, name, func):
+    def error(self, message, pos):
+        line = self.text.count("\n", 0, pos)
+        column = pos - (self.text.rfind("\n", 0, pos) + 1) + 1
+        raise LevelParseError(message, self.source, self.first_line + line, column)
+
+    def unexpected(self, wanted):
+        kind, tok, pos = self.tokens[self.i]
+        found = "end of input" if kind == "end" else repr(tok)
+        self.error(f"expected {wanted} but found {found}", pos)
+
+    def parse(self):
+        # returns a tuple of LevelSpecs, they're immutable so the same one can be instantiated as often as needed
+        tokens = self.tokens
+        if tokens[0][1] != "[":
+            self.unexpected("'['")
+        self.i = 1
+        objs = []
+        while tokens[self.i][1] != "]":
+            objs.append(self.parse_object())
+            tok = tokens[self.i][1]
+            if tok == ",":
+                self.i += 1
+            elif tok != "]":
+                self.unexpected("',' or ']'")
+        self.i += 1
+        if tokens[self.i][0] != "end":
+            self.error(f"unexpected {tokens[self.i][1]!r} after the end of the level", tokens[self.i][2])
+        return tuple(objs)
+
+    def parse_object(self):
+        kind, name, pos = self.tokens[self.i]
+        if kind != "name":
+            self.unexpected("an object")
+        if name not in LEVEL_TYPES:
+            self.error(f"unknown object type {name!r}", pos)
+        self.i += 1
+        args = self.parse_args()
+        lo, hi = LevelParser.arity(name)
+        if not lo <= len(args) <= hi:
+            wanted = lo if lo == hi else f"{lo} to {hi}"
+            self.error(f"{name} takes {wanted} arguments but got {len(args)}", pos)
+        return LevelSpec(name, args)
+
+    def parse_args(self):
+        tokens = self.tokens
+        if tokens[self.i][1] != "(":
+            self.unexpected("'('")
+        self.i += 1
+        args = []
+        while True:
+            kind, value, pos = tokens[self.i]
+            if kind == "vector" or kind == "number":
+                self.i += 1
+                args.append(value)
+            elif kind == "punct" and value == ")":
+                self.i += 1
+                return tuple(args)
+            else:
+                args.append(self.parse_value())
+            kind, value, pos = tokens[self.i]
+            if kind == "punct" and value == ",":
+                self.i += 1
+            elif kind != "punct" or value != ")":
+                self.unexpected("',' or ')'")
+
+    def parse_value(self):
+        kind, tok, pos = self.tokens[self.i]
+        if kind == "string":
+            self.i += 1
+            return ast.literal_eval(tok) # only ever sees a single string literal
+        if kind == "name":
+            if tok in LevelParser.CONSTANTS:
+                self.i += 1
+                return LevelParser.CONSTANTS[tok]
+            if tok == "Vector2": # the vector token only covers Vector2(number, number)
+                self.error("Vector2 takes 2 numbers", pos)
+            self.error(f"{tok!r} is not allowed as a value", pos)
+        if kind == "punct" and tok == "(":
+            return self.parse_args()
+        self.unexpected("a value")
+
+    @staticmethod
+    def arity(name):
+        if name not in LevelParser._ARITY:
+            params = inspect.signature(LEVEL_TYPES[name]).parameters.values()
+            LevelParser._ARITY[name] = (
+                sum(1 for p in params if p.default is p.empty),
+                len(params)
+            )
+        return LevelParser._ARITY[name]
+
+    @staticmethod
+    def build_value(v):
+        if type(v) is V2:
+            return new_vec(v.x, v.y)
+        if type(v) is tuple:
+            return tuple(LevelParser.build_value(i) for i in v)
+        return v
+
+    @staticmethod
+    def instantiate(specs):
+        build = LevelParser.build_value
+        return [LEVEL_TYPES[s.type](*[build(a) for a in s.args]) for s in specs]
+
+    @staticmethod
+    def load(text, source="<level>", first_line=1):
+        return LevelParser.instantiate(LevelParser(text, source, first_line).parse())
+
+    @staticmethod
+    def format_value(v):
+        if type(v) is V2:
+            return f"Vector2({v.x}, {v.y})"
+        if type(v) is tuple:
+            return "(" + ", ".join(LevelParser.format_value(i) for i in v) + ("," if len(v) == 1 else "") + ")"
+        return repr(v)
+
+    @staticmethod
+    def format(specs):
+        # the same text repr() of the built objects gives, without having to build them
+        fmt = LevelParser.format_value
+        return "[" + ", ".join(f"{s.type}({', '.join(fmt(a) for a in s.args)})" for s in specs) + "]"
+
+class BinaryLevel:
+    """
+    Binary version of a .level file, everything is little-endian:
+        header:  b"GEOL", u16 version, u16 name length, name (utf-8)
+        types:   u16 count, then for each: u8 length, type name, u8 length, layout
+        objects: u32 count, then for each: u16 index into the type table followed by its record
+        index:   u32 resident count, u32 chunk count, then for each chunk: f32 x start, f32 x end,
+                 u32 first, u32 count (into the offsets), then u32 offsets of the object records
+        footer:  u64 offset of the index (version 2 and up)
+    A layout has one letter per constructor argument ('v' is a Vector2 stored as 2 f32s), so every
+    record of a type is the same size. A class gets more than one entry if its arguments differ
+    (like CameraYTrigger with an int or a float y). The objects are stored in level order, the index
+    is what LevelStream uses to only read the chunks it needs.
+    """
+    EXTENSION = ".glevel"
+    MAGIC = b"GEOL"
+    VERSION = 2
+    FORMATS = {"v": "2f", "i": "i", "d": "d", "b": "?"}
+    CUT_OFF = (struct.error, IndexError) # what reading past the end of the data raises
+
+    HEADER = struct.Struct("<4sHH")
+    COUNT16 = struct.Struct("<H")
+    COUNT32 = struct.Struct("<I")
+    INDEX = COUNT16
+    CHUNK = struct.Struct("<ffII")
+    FOOTER = struct.Struct("<Q")
+
+    @staticmethod
+    def is_binary(path):
+        return os.path.splitext(path)[1] == BinaryLevel.EXTENSION
+
+    @staticmethod
+    def layout_of(spec):
+        layout = ""
+        for a in spec.args:
+            if type(a) is V2:
+                layout += "v"
+            elif type(a) is bool:
+                layout += "b"
+            elif type(a) is int:
+                layout += "i"
+            elif type(a) is float:
+                layout += "d"
+            else:
+                raise ValueError(f"{spec.type} has a {type(a).__name__} argument, which can't be stored in a binary level")
+        return layout
+
+    @staticmethod
+    def record_struct(layout):
+        return struct.Struct("<" + "".join(BinaryLevel.FORMATS[c] for c in layout))
+
+    @staticmethod
+    def write(path, name, specs):
+        with open(path, "wb") as f:
+            f.write(BinaryLevel.dump(name, specs))
+
+    @staticmethod
+    def dump(name, specs):
+        types = {} # (type name, layout) -> index
+        structs = {} # layout -> its record struct
+        records = []
+        for s in specs:
+            key = (s.type, BinaryLevel.layout_of(s))
+            if key not in types:
+                types[key] = len(types)
+                structs[key[1]] = BinaryLevel.record_struct(key[1])
+            values = []
+            for a in s.args:
+                if type(a) is V2:
+                    values.extend(a)
+                else:
+                    values.append(a)
+            records.append(BinaryLevel.INDEX.pack(types[key]) + structs[key[1]].pack(*values))
+
+        name = name.strip().encode("utf-8")
+        out = [BinaryLevel.HEADER.pack(BinaryLevel.MAGIC, BinaryLevel.VERSION, len(name)), name]
+        out.append(BinaryLevel.COUNT16.pack(len(types)))
+        for type_name, layout in types: # dicts keep insertion order so this matches the indices
+            out += [bytes([len(type_name)]), type_name.encode("ascii"), bytes([len(layout)]), layout.encode("ascii")]
+        out.append(BinaryLevel.COUNT32.pack(len(records)))
+
+        offset = sum(len(i) for i in out)
+        offsets = []
+        for r in records:
+            offsets.append(offset)
+            offset += len(r)
+        out += records
+
+        resident, chunks = LevelStream.split(specs)
+        index = [BinaryLevel.COUNT32.pack(len(resident)), BinaryLevel.COUNT32.pack(len(chunks))]
+        ordered = [offsets[i] for i in resident]
+        for x_start, x_end, objs in chunks:
+            index.append(BinaryLevel.CHUNK.pack(x_start, x_end, len(ordered), len(objs)))
+            ordered += [offsets[i] for i in objs]
+        index.append(struct.pack(f"<{len(ordered)}I", *ordered))
+        out += index
+        out.append(BinaryLevel.FOOTER.pack(offset))
+        return b"".join(out)
+
+    @staticmethod
+    def read_header(buf, path):
+        magic, version, name_len = BinaryLevel.HEADER.unpack_from(buf, 0)
+        if magic != BinaryLevel.MAGIC:
+            raise ValueError(f"{path} is not a binary level")
+        if version > BinaryLevel.VERSION:
+            raise ValueError(f"{path} is version {version} but only up to {BinaryLevel.VERSION} is supported")
+        offset = BinaryLevel.HEADER.size
+        return bytes(buf[offset:offset + name_len]).decode("utf-8"), version, offset + name_len
+
+    @staticmethod
+    def read_name(path):
+        with open(path, "rb") as f:
+            head = f.read(BinaryLevel.HEADER.size + 0xFFFF)
+        try:
+            return BinaryLevel.read_header(head, path)[0]
+        except BinaryLevel.CUT_OFF as e:
+            raise BinaryLevel.corrupt(path, e)
+
+    @staticmethod
+    def corrupt(path, e):
+        # the ValueError for a file that's cut off (like one that's still being written) or has bad offsets
+        return ValueError(f"{path}: the level data is cut off or corrupt ({e})")
+
+    @staticmethod
+    def check_type(type_name, layout):
+        # a type table entry has to be something from LEVEL_TYPES with a layout its constructor can take
+        if type_name not in LEVEL_TYPES:
+            raise ValueError(f"unknown object type {type_name!r}")
+        if any(c not in BinaryLevel.FORMATS for c in layout):
+            raise ValueError(f"bad layout {layout!r} for {type_name}")
+        lo, hi = LevelParser.arity(type_name)
+        if not lo <= len(layout) <= hi:
+            raise ValueError(f"{type_name} can't take {len(layout)} arguments")
+
+    @staticmethod
+    def read_types(mm, offset, path):
+        (type_count,) = BinaryLevel.COUNT16.unpack_from(mm, offset)
+        offset += 2
+        types = []
+        for _ in range(type_count):
+            n = mm[offset]
+            type_name = bytes(mm[offset + 1:offset + 1 + n]).decode("ascii")
+            offset += 1 + n
+            n = mm[offset]
+            layout = bytes(mm[offset + 1:offset + 1 + n]).decode("ascii")
+            offset += 1 + n
+            try:
+                BinaryLevel.check_type(type_name, layout)
+            except ValueError as e:
+                raise ValueError(f"{path}: {e}")
+            types.append((type_name, layout, BinaryLevel.record_struct(layout)))
+        return types, offset
+
+    @staticmethod
+    def read_record(mm, offset, types):
+        (t,) = BinaryLevel.INDEX.unpack_from(mm, offset)
+        if t >= len(types):
+            raise ValueError(f"object type {t} isn't in the type table")
+        type_name, layout, record = types[t]
+        values = record.unpack_from(mm, offset + 2)
+
+        args = []
+        i = 0
+        for c in layout:
+            if c == "v":
+                args.append(V2(values[i], values[i + 1]))
+                i += 2
+            else:
+                args.append(values[i])
+                i += 1
+        return LevelSpec(type_name, tuple(args)), offset + 2 + record.size
+
+    @staticmethod
+    def read(path):
+        with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            return BinaryLevel.parse(mm, path)
+
+    @staticmethod
+    def parse(buf, path):
+        # returns (name, specs), the specs are the same as LevelParser gives for the text version.
+        # anything wrong with the data raises ValueError
+        try:
+            name, _, offset = BinaryLevel.read_header(buf, path)
+            types, offset = BinaryLevel.read_types(buf, offset, path)
+
+            (count,) = BinaryLevel.COUNT32.unpack_from(buf, offset)
+            offset += 4
+            specs = []
+            for _ in range(count):
+                spec, offset = BinaryLevel.read_record(buf, offset, types)
+                specs.append(spec)
+        except BinaryLevel.CUT_OFF as e:
+            raise BinaryLevel.corrupt(path, e)
+
+        return name, tuple(specs)
+
+    @staticmethod
+    def read_at(path, types, offsets_at, first, count):
+        # the specs of 'count' records listed in the index, starting at entry 'first'
+        with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            try:
+                offsets = struct.unpack_from(f"<{count}I", mm, offsets_at + first * 4)
+                return tuple(BinaryLevel.read_record(mm, o, types)[0] for o in offsets)
+            except BinaryLevel.CUT_OFF as e:
+                raise BinaryLevel.corrupt(path, e)
+
+    @staticmethod
+    def read_stream(path):
+        # (resident specs, StreamChunks) without reading any of the chunked objects, None for version 1 files
+        with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            try:
+                _, version, offset = BinaryLevel.read_header(mm, path)
+                if version < 2:
+                    return None
+                types, _ = BinaryLevel.read_types(mm, offset, path)
+
+                (offset,) = BinaryLevel.FOOTER.unpack_from(mm, len(mm) - BinaryLevel.FOOTER.size)
+                (resident_count,) = BinaryLevel.COUNT32.unpack_from(mm, offset)
+                (chunk_count,) = BinaryLevel.COUNT32.unpack_from(mm, offset + 4)
+                offset += 8
+                offsets_at = offset + chunk_count * BinaryLevel.CHUNK.size
+
+                chunks = []
+                for i in range(chunk_count):
+                    x_start, x_end, first, count = BinaryLevel.CHUNK.unpack_from(mm, offset + i * BinaryLevel.CHUNK.size)
+                    load = functools.partial(BinaryLevel.read_at, path, types, offsets_at, first, count)
+                    chunks.append(StreamChunk(x_start, x_end, load))
+            except BinaryLevel.CUT_OFF as e:
+                raise BinaryLevel.corrupt(path, e)
+
+        return BinaryLevel.read_at(path, types, offsets_at, 0, resident_count), chunks
+
+class ClipboardLevel:
+    """
+    What the editor copies a level as: PREFIX followed by the level as a binary level (see BinaryLevel, its
+    header has the version) compressed with zlib & base64'd. A lot shorter than the level code and loading it
+    never goes near the text parser. load() still takes level code too, like the clipboard used to have.
+    """
+    PREFIX = "geosplash:"
+    PIECE = 1 << 16 # base64 characters decoded at once, has to be a multiple of 4
+
+    class Reader:
+        # the decoded bytes of the clipboard text, decoded a piece at a time as they're needed
+        def __init__(self, data):
+            self.pieces = ClipboardLevel.inflate(data)
+            self.buf = b""
+            self.at = 0
+
+        def take(self, n):
+            while len(self.buf) - self.at < n:
+                piece = next(self.pieces, None)
+                if piece is None:
+                    raise ValueError("the level data is cut off")
+                self.buf = self.buf[self.at:] + piece
+                self.at = 0
+            self.at += n
+            return self.buf[self.at - n:self.at]
+
+    @staticmethod
+    def dump(name, objs):
+        with GCPaused():
+            specs = LevelParser(repr(list(objs)), "editor").parse()
+        return ClipboardLevel.PREFIX + base64.b64encode(zlib.compress(BinaryLevel.dump(name, specs))).decode("ascii")
+
+    @staticmethod
+    def is_compact(text):
+        return text.lstrip().startswith(ClipboardLevel.PREFIX)
+
+    @staticmethod
+    def inflate(data):
+        inflate = zlib.decompressobj()
+        for i in range(0, len(data), ClipboardLevel.PIECE):
+            yield inflate.decompress(base64.b64decode(data[i:i + ClipboardLevel.PIECE], validate=True))
+        yield inflate.flush()
+
+    @staticmethod
+    def specs(text, source="clipboard"):
+        # yields the level's name, then its LevelSpecs one by one while the rest is still being decoded
+        data = "".join(text.split())[len(ClipboardLevel.PREFIX):] # clipboards like to add line breaks
+        r = ClipboardLevel.Reader(data)
+        head = r.take(BinaryLevel.HEADER.size)
+        name, _, _ = BinaryLevel.read_header(head + r.take(BinaryLevel.HEADER.unpack(head)[2]), source)
+        yield name
+
+        types = []
+        for _ in range(BinaryLevel.COUNT16.unpack(r.take(2))[0]):
+            type_name = r.take(r.take(1)[0]).decode("ascii")
+            layout = r.take(r.take(1)[0]).decode("ascii")
+            BinaryLevel.check_type(type_name, layout)
+            types.append((type_name, layout, BinaryLevel.record_struct(layout)))
+
+        for _ in range(BinaryLevel.COUNT32.unpack(r.take(4))[0]):
+            index = r.take(2)
+            (t,) = BinaryLevel.INDEX.unpack(index)
+            if t >= len(types):
+                raise ValueError(f"object type {t} isn't in the type table")
+            yield BinaryLevel.read_record(index + r.take(types[t][2].size), 0, types)[0]
+        # the chunk index after the objects is only for streaming from a file, it's never needed here
+
+    @staticmethod
+    def objects(text, source="clipboard"):
+        # builds the objects as they're decoded, the whole level is never held as bytes or specs at once
+        specs = ClipboardLevel.specs(text, source)
+        next(specs) # the name
+        for s in specs:
+            yield LevelParser.instantiate((s,))[0]
+
+    @staticmethod
+    def load(text, source="clipboard"):
+        # the objects of a level on the clipboard in either format, raises LevelParseError if it's not valid
+        if not ClipboardLevel.is_compact(text):
+            return LevelParser.load(text, source)
+        try:
+            with GCPaused():
+                return list(ClipboardLevel.objects(text, source))
+        except (ValueError, TypeError, struct.error, zlib.error) as e:
+            raise LevelParseError(str(e), source, 1, 1)
+
+StreamChunk = namedtuple("StreamChunk", "x_start x_end load") # load() gives the chunk's LevelSpecs
+
+class LevelStream:
+    """
+    Keeps only the part of a file level around the screen alive. Objects are put in CHUNK_WIDTH wide
+    chunks by x position, chunks are built once they get within AHEAD of the screen and destroyed when
+    they're more than BEHIND past it. Dying reloads the level from its (immutable) specs, so retired
+    objects don't need to be kept around. Things without a position, or that other objects look up
+    (the player, the win wall, ...) are resident and live as long as the level does.
+    """
+    CHUNK_WIDTH = 2000
+    AHEAD = stream_ahead(arg_value("--stream-ahead"), 3000.0)
+    BEHIND = 1000
+    RESIDENT = ("Player", "Ground", "WinWall", "PlayerSpawn")
+
+    def __init__(self, resident, chunks):
+        self.resident = resident
+        self.chunks = chunks # sorted by x_start
+        self.starts = [c.x_start for c in chunks]
+        self.max_span = max((c.x_end - c.x_start for c in chunks), default=0)
+        self.loaded = {} # chunk index -> objects
+
+    @staticmethod
+    def extent(spec):
+        # the x range an object covers, None if it should stay loaded
+        if spec.type in LevelStream.RESIDENT or len(spec.args) == 0 or type(spec.args[0]) is not V2:
+            return None
+        x = spec.args[0].x
+        if spec.type == "Tile":
+            return x, x + spec.args[1].x
+        return x, x
+
+    @staticmethod
+    def split(specs):
+        # (resident indices, [(x start, x end, indices), ...]), the indices of each chunk stay in level order
+        resident = []
+        buckets = {}
+        for i, s in enumerate(specs):
+            e = LevelStream.extent(s)
+            if e is None:
+                resident.append(i)
+                continue
+            b = buckets.setdefault(math.floor(e[0] / LevelStream.CHUNK_WIDTH), [e[1], []])
+            b[0] = max(b[0], e[1])
+            b[1].append(i)
+        return resident, [(key * LevelStream.CHUNK_WIDTH, end, objs) for key, (end, objs) in sorted(buckets.items())]
+
+    @staticmethod
+    def from_specs(specs):
+        resident, chunks = LevelStream.split(specs)
+        return (
+            tuple(specs[i] for i in resident),
+            [StreamChunk(start, end, functools.partial(tuple, [specs[i] for i in objs])) for start, end, objs in chunks]
+        )
+
+    @staticmethod
+    def read_file(file):
+        # (resident specs, chunks) for a level file, binary levels only read their index here
+        if BinaryLevel.is_binary(file):
+            index = BinaryLevel.read_stream(file)
+            if index is not None:
+                return index
+        return LevelStream.from_specs(LevelCache.get(file)[1])
+
+    def start(self):
+        return LevelParser.instantiate(self.resident)
+
+    def swap(self, specs, gone, added):
+        # switches to the chunks of a changed version of the level. The loaded chunks keep their objects, without
+        # the gone ones, & the added objects that land in them or are resident are returned to be made now, the
+        # rest get built with their chunk
+        resident, chunks = LevelStream.from_specs(specs)
+        by_start = {c.x_start: i for i, c in enumerate(chunks)}
+        gone = set(gone)
+        loaded = {}
+        for i, objs in self.loaded.items():
+            j = by_start.get(self.chunks[i].x_start)
+            if j is not None:
+                loaded[j] = [o for o in objs if o not in gone]
+
+        made = []
+        for s, o in zip(added, LevelParser.instantiate(added)):
+            e = LevelStream.extent(s)
+            if e is None:
+                made.append(o)
+                continue
+            j = by_start[math.floor(e[0] / LevelStream.CHUNK_WIDTH) * LevelStream.CHUNK_WIDTH]
+            if j in loaded:
+                loaded[j].append(o)
+                made.append(o)
+
+        self.resident = resident
+        self.chunks = chunks
+        self.starts = [c.x_start for c in chunks]
+        self.max_span = max((c.x_end - c.x_start for c in chunks), default=0)
+        self.loaded = loaded
+        return made
+
+    def update(self, game):
+        cam_x = game.camera.target.x
+        player = game.get_player()
+        player_x = cam_x if player is None else player.position.x
+        left = min(cam_x, player_x) - screen_width/2 - LevelStream.BEHIND
+        right = max(cam_x, player_x) + screen_width/2 + LevelStream.AHEAD
+
+        # a chunk's width of slack so chunks right on the edge don't get built & destroyed every other frame
+        for i in [i for i in self.loaded if self.chunks[i].x_end < left - LevelStream.CHUNK_WIDTH or self.chunks[i].x_start > right + LevelStream.CHUNK_WIDTH]:
+            game.destroy(self.loaded.pop(i))
+
+        first = bisect.bisect_left(self.starts, left - self.max_span)
+        last = bisect.bisect_right(self.starts, right)
+        for i in range(first, last):
+            if i not in self.loaded and self.chunks[i].x_end >= left:
+                objs = LevelParser.instantiate(self.chunks[i].load())
+                self.loaded[i] = objs
+                game.make(objs)
+
+class LevelOptimizer:
+    """
+    Makes a level smaller without changing how it plays. Tiles in the same row (same y & height) that touch
+    or overlap become one wider tile and exact copies of tiles & spikes are removed. A player corner touches
+    the merged tile exactly when it touched one of the old ones & what a tile does only depends on the corner's
+    y, so collision stays the same.
+    Only tiles & spikes with nothing else between them in the level get combined, slopes move the player and
+    portals & pads change its state in the middle of a tick, so the tiles before & after them have to stay apart.
+    Tiles aren't merged into columns: a tile only lands the player in its top 25 units and kills it on the rest,
+    two stacked tiles don't act like one tall one. Tiles hidden inside a different sized tile stay for the same reason.
+    """
+    STATIC = ("Tile", "Spike")
+    # Game.build_visible() only looks at an object's x, past this a merged tile could stop running its
+    # logic while the player is still on the far end of it
+    MAX_WIDTH = Game.VISIBLE_THRESHOLD
+
+    @staticmethod
+    def optimize(specs):
+        # (new specs, {type: objects removed}), a merged tile takes the place of the first tile of its row
+        out = []
+        removed = {}
+        run = []
+        for s in specs:
+            if s.type in LevelOptimizer.STATIC:
+                run.append(s)
+                continue
+            out += LevelOptimizer.optimize_run(run, removed)
+            run = []
+            out.append(s)
+        out += LevelOptimizer.optimize_run(run, removed)
+        return out, removed
+
+    @staticmethod
+    def is_tile(spec):
+        return spec.type == "Tile" and len(spec.args) == 2 and all(type(a) is V2 for a in spec.args)
+
+    @staticmethod
+    def key(spec):
+        if spec.type == "Spike" and len(spec.args) == 1:
+            return LevelSpec("Spike", (spec.args[0], 0))
+        return spec
+
+    @staticmethod
+    def optimize_run(run, removed):
+        seen = set()
+        unique = []
+        for s in run:
+            k = LevelOptimizer.key(s)
+            if k in seen:
+                removed[s.type] = removed.get(s.type, 0) + 1
+                continue
+            seen.add(k)
+            unique.append(s)
+
+        rows = {} # (y, height) -> [(x, width, index)]
+        for i, s in enumerate(unique):
+            if LevelOptimizer.is_tile(s):
+                pos, dim = s.args
+                rows.setdefault((pos.y, dim.y), []).append((pos.x, dim.x, i))
+
+        replace = {} # index -> merged spec, None if it went into another tile
+        for (y, height), tiles in rows.items():
+            tiles.sort()
+            start, end, members = None, None, []
+            for x, width, i in tiles + [(None, None, None)]:
+                if x is not None and members and x <= end and max(end, x + width) - start <= LevelOptimizer.MAX_WIDTH:
+                    end = max(end, x + width)
+                    members.append(i)
+                    continue
+                if len(members) > 1:
+                    first = min(members)
+                    for m in members:
+                        replace[m] = None
+                    replace[first] = LevelSpec("Tile", (V2(start, y), V2(end - start, height)))
+                    removed["Tile"] = removed.get("Tile", 0) + len(members) - 1
+                start, end, members = x, None if x is None else x + width, [i]
+
+        out = []
+        for i, s in enumerate(unique):
+            if i in replace:
+                if replace[i] is not None:
+                    out.append(replace[i])
+            else:
+                out.append(s)
+        return out
+
+BudgetWindow = namedtuple("BudgetWindow", "x_start x_end visible candidates logic draw") # worst tick of one screen
+BudgetHotspot = namedtuple("BudgetHotspot", "x_start x_end message")
+
+class LevelBudget:
+    """
+    What a level costs to run, worked out without playing it. The camera is moved through the level a screen
+    at a time and for every position the objects build_visible() would pick are counted, as are the collision
+    candidates (objects with an area in the player's column, at any height). logic() and draw_cmds() are timed
+    for every class the level uses & multiplied by those counts to estimate each tick, actual drawing needs
+    a window so it isn't included.
+    Hotspots are ticks that take more than HOT_SHARE of a frame, long stretches of stacked spikes and
+    triggers, portals, orbs & pads that overlap, since those go off on the same tick.
+    """
+    FRAME = 1 / 60
+    HOT_SHARE = 0.5
+    STEP = 25 # camera steps per screen are this far apart
+    REPS = 200
+    SAMPLES = 20 # objects of each class that are timed
+    SPIKE_STRETCH = 20 # spikes in a stretch before it's reported
+
+    @staticmethod
+    def measure(objs):
+        # {class name: (seconds per logic(), seconds per draw_cmds())}, in a scratch game with the player out of
+        # reach so timing doesn't set anything off
+        global game
+        previous = game
+        game = Game()
+        try:
+            game.camera = Camera2D(Vector2(0, 0), Vector2(0, 0), 0, 1)
+            player = Player(Vector2(-1_000_000, 0))
+            game.make([player])
+            samples = {}
+            for o in objs:
+                s = samples.setdefault(type(o), [])
+                if type(o) is not Player and len(s) < LevelBudget.SAMPLES:
+                    s.append(o)
+            samples[Player] = [player]
+            game.make([o for s in samples.values() for o in s if o is not player])
+
+            costs = {}
+            cmds = []
+            for cls, s in samples.items():
+                player.halted = cls is not Player # halted players can't die, but still collide
+                start = time.perf_counter()
+                for _ in range(LevelBudget.REPS):
+                    for o in s:
+                        o.logic()
+                logic = time.perf_counter() - start
+                start = time.perf_counter()
+                for _ in range(LevelBudget.REPS):
+                    for o in s:
+                        o.draw_cmds(cmds)
+                    cmds.clear()
+                draw = time.perf_counter() - start
+                calls = LevelBudget.REPS * len(s)
+                costs[cls.__name__] = (logic / calls, draw / calls)
+            return costs
+        finally:
+            game = previous
+
+    @staticmethod
+    def analyze(level, costs=None):
+        # ([BudgetWindow per screen], [BudgetHotspot], costs) for a Level
+        objs = level.get()
+        if costs is None:
+            costs = LevelBudget.measure(objs)
+        always = [o for o in objs if o.always_think]
+        placed = sorted((o for o in objs if not o.always_think), key=lambda o: o.position.x)
+        xs = [o.position.x for o in placed]
+
+        # running totals so a window's cost is two lookups
+        logic_sum, draw_sum = [0], [0]
+        for o in placed:
+            l, d = costs[type(o).__name__]
+            logic_sum.append(logic_sum[-1] + l)
+            draw_sum.append(draw_sum[-1] + d)
+        always_logic = sum(costs[type(o).__name__][0] for o in always)
+        always_draw = sum(costs[type(o).__name__][1] for o in always)
+
+        areas = sorted((o.area.position.x, o.area.position.x + o.area.dimension.x) for o in placed if o.area is not None)
+        area_xs = [a[0] for a in areas]
+        widest = max((a[1] - a[0] for a in areas), default=0)
+
+        player = next((o for o in objs if type(o) is Player), None)
+        first = player.position.x if player is not None else (xs[0] if xs else 0)
+        win = next((o for o in objs if type(o) is WinWall), None)
+        last = win.position.x if win is not None else (xs[-1] if xs else first)
+
+        reach = screen_width/2 + Game.VISIBLE_THRESHOLD
+        windows = []
+        hot_start = None
+        hotspots = []
+        x = first
+        while x <= last:
+            visible = candidates_max = 0
+            worst = None # (logic, draw) of the slowest tick
+            for step in range(0, screen_width, LevelBudget.STEP):
+                px = x + step
+                cam_x = px + 200 # where update_cam() keeps the camera
+                lo = bisect.bisect_left(xs, cam_x - reach)
+                hi = bisect.bisect_right(xs, cam_x + reach)
+                logic = always_logic + logic_sum[hi] - logic_sum[lo]
+                draw = always_draw + draw_sum[hi] - draw_sum[lo]
+
+                candidates = 0
+                for a in range(bisect.bisect_left(area_xs, px - widest), bisect.bisect_right(area_xs, px + Player.WIDTH)):
+                    if areas[a][1] >= px:
+                        candidates += 1
+
+                visible = max(visible, len(always) + hi - lo)
+                candidates_max = max(candidates_max, candidates)
+                if worst is None or logic + draw > sum(worst):
+                    worst = (logic, draw)
+
+                hot = logic + draw > LevelBudget.FRAME * LevelBudget.HOT_SHARE
+                if hot and hot_start is None:
+                    hot_start = px
+                elif not hot and hot_start is not None:
+                    hotspots.append(BudgetHotspot(hot_start, px, "ticks over budget"))
+                    hot_start = None
+            windows.append(BudgetWindow(x, x + screen_width, visible, candidates_max, *worst))
+            x += screen_width
+        if hot_start is not None:
+            hotspots.append(BudgetHotspot(hot_start, x, "ticks over budget"))
+
+        hotspots += LevelBudget.spike_stretches(placed, costs)
+        hotspots += LevelBudget.overlapping_triggers(placed)
+        hotspots.sort()
+        return windows, hotspots, costs
+
+    @staticmethod
+    def spike_stretches(placed, costs):
+        columns = {} # x -> spikes at that x
+        for o in placed:
+            if type(o) is Spike:
+                columns[o.position.x] = columns.get(o.position.x, 0) + 1
+
+        hotspots = []
+        stretch = []
+        for x in sorted(columns) + [None]:
+            if x is not None and (not stretch or x - stretch[-1] <= Spike.WIDTH * 2):
+                stretch.append(x)
+                continue
+            count = sum(columns[i] for i in stretch)
+            stacked = max((columns[i] for i in stretch), default=0)
+            if count >= LevelBudget.SPIKE_STRETCH and stacked > 1:
+                ms = count * sum(costs["Spike"]) * 1000
+                hotspots.append(BudgetHotspot(stretch[0], stretch[-1], f"{count} spikes, up to {stacked} stacked (~{ms:.2f} ms a tick)"))
+            stretch = [x]
+        return hotspots
+
+    @staticmethod
+    def overlapping_triggers(placed):
+        # camera triggers go off once the player passes their x, the rest when the player touches their area
+        hotspots = []
+        triggers = [o for o in placed if isinstance(o, Trigger)]
+        for a, b in zip(triggers, triggers[1:]):
+            if b.position.x - a.position.x < a.area.dimension.x:
+                hotspots.append(BudgetHotspot(a.position.x, b.position.x, f"{type(a).__name__} & {type(b).__name__} go off on the same tick"))
+
+        touch = [o for o in placed if isinstance(o, (Portal, Orb, Pad)) and o.area is not None]
+        pairs = []
+        for i, a in enumerate(touch):
+            for b in touch[i+1:]:
+                if b.position.x > a.position.x + max(a.area.dimension.x, Orb.RADIUS * 2):
+                    break
+                if isinstance(a, Orb) and isinstance(b, Orb): # orbs are circles, their area is just the middle
+                    hit = VecMath.distance(a.position, b.position) <= a.radius + b.radius
+                else:
+                    hit = a.area.check_collision_with_rect(b.area)
+                if hit:
+                    pairs.append((a, b))
+
+        # pairs next to each other are reported together, pads are often placed in overlapping rows
+        groups = [] # [x start, x end, objects]
+        for a, b in pairs:
+            start, end = sorted((a.position.x, b.position.x))
+            if groups and start <= groups[-1][1]:
+                groups[-1][1] = max(groups[-1][1], end)
+                groups[-1][2] += [a, b]
+            else:
+                groups.append([start, end, [a, b]])
+
+        for x_start, x_end, objs in groups:
+            counts = {}
+            for o in dict.fromkeys(objs):
+                counts[type(o).__name__] = counts.get(type(o).__name__, 0) + 1
+            names = " & ".join(t if n == 1 else f"{n} {t}s" for t, n in counts.items())
+            hotspots.append(BudgetHotspot(x_start, x_end, f"{names} overlap"))
+        return hotspots
+
+    @staticmethod
+    def format(windows, hotspots):
+        lines = [f"{'screen x':>17}{'visible':>9}{'collision':>11}{'logic':>10}{'draw list':>11}{'frame':>8}"]
+        for w in windows:
+            total = w.logic + w.draw
+            lines.append(
+                f"{w.x_start:>8.0f}-{w.x_end:<8.0f}{w.visible:>9}{w.candidates:>11}"
+                f"{w.logic * 1000:>8.2f}ms{w.draw * 1000:>9.2f}ms{total / LevelBudget.FRAME * 100:>7.0f}%"
+            )
+        if windows:
+            worst = max(windows, key=lambda w: w.logic + w.draw)
+            lines.append(
+                f"worst tick: {(worst.logic + worst.draw) * 1000:.2f} ms around x {worst.x_start:.0f}, "
+                f"most visible: {max(w.visible for w in windows)}, most collision candidates: {max(w.candidates for w in windows)}"
+            )
+        if not hotspots:
+            lines.append("no hotspots")
+        for h in hotspots:
+            lines.append(f"hotspot x {h.x_start:.0f}-{h.x_end:.0f}: {h.message}")
+        return "\n".join(lines)
+
+class LevelCache:
+    """
+    Parsed levels, (name, LevelSpecs), for every Level that comes from a file. Entries are keyed by the hash
+    of the file's contents & the least recently used ones are dropped once more than BUDGET objects are cached.
+    The hash is remembered per (path, mtime, size) so an unchanged file isn't read again at all.
+    With --persist-level-cache parsed text levels are also saved in FOLDER as binary levels, named after
+    their hash, so the next run doesn't have to parse them either.
+    """
+    BUDGET = 500_000 # objects
+    PERSIST = "--persist-level-cache" in sys.argv
+    FOLDER = ".level_cache"
+
+    _entries = OrderedDict() # hash -> (name, specs), oldest first
+    _hashes = {} # path -> (mtime, size, hash)
+    _size = 0
+    _lock = threading.Lock() # levels get prefetched from other threads
+
+    hits = 0
+    misses = 0
+    disk_hits = 0
+    evictions = 0
+
+    @staticmethod
+    def get(path):
+        packed = Assets.level(path)
+        if packed is not None: # built in levels in a release, no need to look at the file
+            data = packed
+            stat = None
+        else:
+            stat = os.stat(path)
+            with LevelCache._lock:
+                known = LevelCache._hashes.get(path)
+                if known is not None and known[:2] == (stat.st_mtime_ns, stat.st_size):
+                    if (entry := LevelCache._hit(known[2])) is not None:
+                        return entry
+
+            with open(path, "rb") as f:
+                Assets.opens += 1
+                data = f.read()
+        digest = hashlib.sha1(data).hexdigest()
+        with LevelCache._lock:
+            if stat is not None:
+                LevelCache._hashes[path] = (stat.st_mtime_ns, stat.st_size, digest)
+            if (entry := LevelCache._hit(digest)) is not None:
+                return entry
+
+        # parsing happens outside the lock
+        entry = BinaryLevel.parse(data, path) if packed is not None else LevelCache.load(path, data, digest)
+        with LevelCache._lock:
+            LevelCache.misses += 1
+            if digest not in LevelCache._entries:
+                LevelCache._entries[digest] = entry
+                LevelCache._size += len(entry[1])
+                while LevelCache._size > LevelCache.BUDGET and len(LevelCache._entries) > 1:
+                    _, (_, specs) = LevelCache._entries.popitem(last=False)
+                    LevelCache._size -= len(specs)
+                    LevelCache.evictions += 1
+        return entry
+
+    @staticmethod
+    def stamp(path):
+        # (mtime, size, hash) of a level file, to tell whether something made from it is out of date.
+        # the hash is only worked out again when the mtime or size changed
+        if Assets.level(path) is not None:
+            return "packed" # can't change while the game runs
+        stat = os.stat(path)
+        with LevelCache._lock:
+            known = LevelCache._hashes.get(path)
+            if known is not None and known[:2] == (stat.st_mtime_ns, stat.st_size):
+                return known
+        with open(path, "rb") as f:
+            Assets.opens += 1
+            digest = hashlib.sha1(f.read()).hexdigest()
+        known = (stat.st_mtime_ns, stat.st_size, digest)
+        with LevelCache._lock:
+            LevelCache._hashes[path] = known
+        return known
+
+    @staticmethod
+    def _hit(digest): # call with the lock held
+        entry = LevelCache._entries.get(digest)
+        if entry is not None:
+            LevelCache._entries.move_to_end(digest)
+            LevelCache.hits += 1
+        return entry
+
+    @staticmethod
+    def load(path, data, digest):
+        if not LevelCache.PERSIST or BinaryLevel.is_binary(path):
+            return Level.parse_data(path, data)
+
+        compiled = os.path.join(LevelCache.FOLDER, digest + BinaryLevel.EXTENSION)
+        if os.path.exists(compiled):
+            LevelCache.disk_hits += 1
+            return BinaryLevel.read(compiled)
+
+        name, specs = Level.parse_data(path, data)
+        try:
+            os.makedirs(LevelCache.FOLDER, exist_ok=True)
+            tmp = compiled + f".{os.getpid()}.{threading.get_ident()}.tmp"
+            BinaryLevel.write(tmp, name, specs)
+            os.replace(tmp, compiled)
+        except (OSError, ValueError) as e:
+            sys.stderr.write(f"Couldn't save the compiled version of '{path}': {e}\n")
+        return name, specs
+
+    @staticmethod
+    def clear():
+        with LevelCache._lock:
+            LevelCache._entries.clear()
+            LevelCache._hashes.clear()
+            LevelCache._size = 0
+
+    @staticmethod
+    def summary():
+        return (
+            f"level cache: {len(LevelCache._entries)} levels / {LevelCache._size} objects, "
+            f"{LevelCache.hits} hits, {LevelCache.misses} misses ({LevelCache.disk_hits} from disk), {LevelCache.evictions} evictions"
+        )
+
+class LevelWatcher:
+    """
+    Looks at a level file every INTERVAL seconds (a stat, the file is only read when it changed) & works out
+    which objects were added to or removed from it, so the level can be changed in place while it's played or
+    edited, like when a script is generating it. A changed object is a removed one & an added one, everything
+    else stays as it is. The player & the ground are left alone, the player keeps going from where it is.
+    """
+    INTERVAL = 0.5
+    SKIP = ("Player", "Ground")
+
+    def __init__(self, path):
+        self.path = path
+        self.stamp = LevelWatcher.stamp_of(path)
+        self.specs = LevelCache.get(path)[1]
+        self.next_poll = time.perf_counter() + LevelWatcher.INTERVAL
+
+    @staticmethod
+    def start(path):
+        # a watcher for a level file, None for built in levels read from assets.pack
+        if path is None or Assets.level(path) is not None or not os.path.exists(path):
+            return None
+        return LevelWatcher(path)
+
+    @staticmethod
+    def stamp_of(path):
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+    def poll(self):
+        # (removed specs, added specs) if the file changed since the last look, otherwise None
+        now = time.perf_counter()
+        if now < self.next_poll:
+            return None
+        self.next_poll = now + LevelWatcher.INTERVAL
+        stamp = LevelWatcher.stamp_of(self.path)
+        if stamp is None or stamp == self.stamp:
+            return None
+        self.stamp = stamp
+        try:
+            specs = LevelCache.get(self.path)[1]
+        except (OSError, ValueError) as e: # probably still being written, it'll change again when it's done
+            sys.stderr.write(f"Couldn't reload '{self.path}': {e}\n")
+            return None
+        removed, added = LevelWatcher.diff(self.specs, specs)
+        self.specs = specs
+        if not removed and not added:
+            return None
+        return removed, added
+
+    @staticmethod
+    def diff(old, new):
+        # the specs only in old & the ones only in new, an object that's in there twice counts twice
+        skip = LevelWatcher.SKIP
+        before = Counter(s for s in old if s.type not in skip)
+        after = Counter(s for s in new if s.type not in skip)
+        removed = before - after
+        extra = after - before
+        added = [] # in level order
+        for s in new:
+            if extra[s] > 0:
+                extra[s] -= 1
+                added.append(s)
+        return list(removed.elements()), added
+
+    @staticmethod
+    def find(objs, removed):
+        # one live object for every removed spec, found by saving the objects of those types. The removed specs
+        # are built & saved too, the file could say 0.1 where a live object has the closest float32 to it
+        left = Counter(LevelParser(repr(LevelParser.instantiate(removed)), "live").parse())
+        types = {s.type for s in left}
+        candidates = [o for o in objs if type(o).__name__ in types]
+        found = []
+        for o, s in zip(candidates, LevelParser(repr(candidates), "live").parse()):
+            if left[s] > 0:
+                left[s] -= 1
+                found.append(o)
+        return found
+
+class Level:
+    def __init__(self, name, func, path=None):
         self.name = name.strip()
         self.func = func
         self.cached = None
+        self.path = path # only for levels that come from a file
+        self.source = path # the file the objects come from, EditorLevel only keeps this one so it's never streamed
+        self.stream_index = None
+        self.stream_stamp = None # LevelCache.stamp() of the file when stream_index was made
+        self.preparing = None # future from LevelPrefetcher
 
     @staticmethod
-    def from_file(file):
-        if file == Level.CACHED_LEVEL[0]:
-            print("Level loaded from file cache!")
-            return Level.CACHED_LEVEL[1]
-        
+    def from_file(file, name=None): # the name can come from the LevelIndex so the file isn't opened
         def level_data():
-            print("Loading level from file ...")
-            with open(file, "r") as f: # should probably only do this when the level data is actually requested
-                lines = f.readlines()
-                
-                name = lines[0]
-                code = lines[1]
+            # the specs are immutable so every get() builds fresh objects from the cached ones
+            return LevelParser.instantiate(LevelCache.get(file)[1])
 
-                c = eval(code) # yes I know this is a vulnerability, I'm not going to fix it since this is just a big test.
-                Level.CACHED_LEVEL = (file, Level(name, lambda: eval(code)))
-                return c
-            
+        return Level(Level.read_name(file) if name is None else name, level_data, file)
+
+    @staticmethod
+    def read_name(file):
+        packed = Assets.level(file) # built in levels come from assets.pack when there is one
+        if packed is not None:
+            return BinaryLevel.read_header(packed, file)[0]
+        Assets.opens += 1
+        if BinaryLevel.is_binary(file):
+            return BinaryLevel.read_name(file)
         with open(file, "r") as f:
-            name = f.readline()
-            l = Level(name, level_data)
-        return l
+            return f.readline()
+
+    @staticmethod
+    def read_file(file):
+        # (name, specs) for both the text and binary formats, not cached (see LevelCache)
+        if BinaryLevel.is_binary(file):
+            return BinaryLevel.read(file)
+        with open(file, "rb") as f:
+            return Level.parse_data(file, f.read())
+
+    @staticmethod
+    def parse_data(file, data):
+        if BinaryLevel.is_binary(file):
+            return BinaryLevel.parse(data, file)
+        name, _, code = data.decode("utf-8").partition("\n")
+        return name, LevelParser(code, file, first_line=2).parse()
 
     def get(self):
         return self.func()
 
+    def prepare(self):
+        # everything that can be done before the level is picked, runs on the prefetch thread
+        if self.path is not None:
+            self.index_stream()
+
+    def is_prepared(self):
+        return self.stream_index is not None
+
+    def index_stream(self):
+        # the levels on the level select live all session, so the file may have changed since it was indexed
+        stamp = LevelCache.stamp(self.path)
+        if self.stream_index is None or stamp != self.stream_stamp:
+            self.stream_index = LevelStream.read_file(self.path)
+            self.stream_stamp = stamp
+        return self.stream_index
+
+    def stream(self):
+        # a new LevelStream for playing this level, None if it has to be built all at once
+        if self.path is None:
+            return None
+        if self.preparing is not None:
+            self.preparing.result() # usually done already, otherwise it's still quicker than starting over
+        return LevelStream(*self.index_stream())
+
+class LevelPrefetcher:
+    """
+    Gets the level focused on the level select screen & its neighbours ready (parsed, chunk index built)
+    on a background thread, so picking one doesn't stall the frame it gets loaded on.
+    """
+    NEIGHBOURS = 1
+    _executor = None
+
+    @staticmethod
+    def around(levels, index):
+        # the focused one goes first, there's only one worker
+        for offset in range(LevelPrefetcher.NEIGHBOURS + 1):
+            for i in {index + offset, index - offset}:
+                if 0 <= i < len(levels):
+                    LevelPrefetcher.request(levels[i])
+
+    @staticmethod
+    def request(level):
+        if level.path is None or level.preparing is not None or level.is_prepared():
+            return
+        if LevelPrefetcher._executor is None:
+            LevelPrefetcher._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="prefetch")
+        level.preparing = LevelPrefetcher._executor.submit(level.prepare)
+
+    @staticmethod
+    def shutdown():
+        if LevelPrefetcher._executor is not None:
+            LevelPrefetcher._executor.shutdown(wait=False, cancel_futures=True)
+            LevelPrefetcher._executor = None
+
+class LevelSaver(threading.Thread):
+    """
+    Writes a level on a background thread. Placed objects aren't changed by the editor (only added & removed),
+    so the editor just hands over a tuple of them instead of cloning everything, the reprs are made here.
+    The text goes to a temp file next to the level that gets fsynced & renamed over it, so crashing
+    mid save leaves the old file alone.
+    """
+    BATCH = 256 # objects between progress updates
+    UMASK = read_umask() # read before any saver thread exists
+
+    def __init__(self, path, name, objs):
+        super().__init__(name="level save") # not a daemon, closing the game waits for the save to finish
+        self.path = path
+        self.level_name = name
+        self.objs = objs
+        self.progress = 0 # 0 to 1
+        self.done = False
+        self.error = None
+
+    def run(self):
+        try:
+            parts = []
+            for i, o in enumerate(self.objs):
+                parts.append(repr(o))
+                if i % LevelSaver.BATCH == 0:
+                    self.progress = 0.9 * i / len(self.objs)
+                    time.sleep(0) # let the render thread have the GIL
+            LevelSaver.write_atomic(self.path, self.level_name + "\n[" + ", ".join(parts) + "]")
+        except Exception as e:
+            self.error = e
+        finally:
+            self.progress = 1
+            self.done = True
+
+    @staticmethod
+    def file_mode(path):
+        # the permissions the level keeps, or what open() would've given a new file
+        try:
+            return os.stat(path).st_mode & 0o7777
+        except FileNotFoundError:
+            return 0o666 & ~LevelSaver.UMASK
+
+    @staticmethod
+    def write_atomic(path, text):
+        folder = os.path.dirname(path) or "."
+        fd, tmp = tempfile.mkstemp(prefix=".saving-", suffix=".tmp", dir=folder)
+        try:
+            with os.fdopen(fd, "w") as f:
+                f.write(text)
+                f.flush()
+                os.fsync(f.fileno())
+            os.chmod(tmp, LevelSaver.file_mode(path)) # mkstemp makes it 0600, replace() would keep that
+            os.replace(tmp, path)
+        except BaseException:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            raise
+
+        if hasattr(os, "O_DIRECTORY"): # so the rename itself survives a crash too, windows can't open folders
+            dir_fd = os.open(folder, os.O_RDONLY | os.O_DIRECTORY)
+            try:
+                os.fsync(dir_fd)
+            finally:
+                os.close(dir_fd)
+
 _attempts = 0
 class AttemptCounter(GameObj):
     def __init__(self, position):
@@ -372,7 +2135,11 @@ class AttemptCounter(GameObj):
         p = VecMath.floor_i(self.position)
         draw_text("Attempt #" + repr(_attempts), p.x, p.y, 48, BLACK)
 
+    def draw_cmds(self, out):
+        out.append(Draw.cmd(Draw.TEXT, int(self.position.x), int(self.position.y), BLACK, "Attempt #" + repr(_attempts), 48))
+
 class Player(GameObj):
+    LAYER = RenderLayer.PLAYER
     COLOR = BLUE
 
     WIDTH = 50
@@ -407,8 +2174,7 @@ class Player(GameObj):
     @staticmethod
     def get_cube_sprite():
         if Player._CUBE_SPRITE is None:
-            with RaylibImage(Player.CUBE_SPRITE_PATH) as image:
-                image_resize_nn(image, Player.WIDTH, Player.HEIGHT)
+            with RaylibImage(Player.CUBE_SPRITE_PATH, Player.WIDTH, Player.HEIGHT) as image:
                 Player._CUBE_SPRITE = load_texture_from_image(image) 
                 # but wait you never unload the player texture! Is it really necessary though? The player always exists.
         
@@ -417,11 +2183,8 @@ class Player(GameObj):
     @staticmethod
     def get_ship_sprite(orientation):
         if Player._SHIP_SPRITE is None or Player._SHIP_SPITE_FLIPPED_V is None:
-            with RaylibImage(Player.SHIP_SPRITE_PATH) as image:
-                with RaylibImage(Player.CUBE_SPRITE_PATH) as cube_image:
-                    image_resize_nn(image, Player.SHIP_WIDTH*2, Player.SHIP_HEIGHT*4)
-
-                    image_resize_nn(cube_image, Player.WIDTH//2, Player.HEIGHT//2)
+            with RaylibImage(Player.SHIP_SPRITE_PATH, Player.SHIP_WIDTH*2, Player.SHIP_HEIGHT*4, writable=True) as image:
+                with RaylibImage(Player.CUBE_SPRITE_PATH, Player.WIDTH//2, Player.HEIGHT//2) as cube_image:
                     image_draw(image, cube_image, Rectangle(0, 0, cube_image.width, cube_image.height), Rectangle(20, 5, cube_image.width, cube_image.height), WHITE)
 
                     Player._SHIP_SPRITE = load_texture_from_image(image)
@@ -437,9 +2200,7 @@ class Player(GameObj):
     @staticmethod
     def get_ball_sprite():
         if Player._BALL_SPRITE is None:
-            with RaylibImage(Player.BALL_SPRITE_PATH) as image:
-                image_resize_nn(image, Player.BALL_SIZE * 2, Player.BALL_SIZE *2)
-
+            with RaylibImage(Player.BALL_SPRITE_PATH, Player.BALL_SIZE * 2, Player.BALL_SIZE *2) as image:
                 Player._BALL_SPRITE = load_texture_from_image(image)
         
         return Player._BALL_SPRITE
@@ -639,7 +2400,7 @@ class Player(GameObj):
         if self.dead: return
         if self.halted: return
         
-        if is_key_released(KeyboardKey(0).KEY_ESCAPE):
+        if Input.back_released():
             if (preview := get_game().find_by_tag("Preview")) is not None:
                 preview.return_to_editor()
             else:
@@ -758,7 +2519,38 @@ class Player(GameObj):
         if self.dead: return
         self.modes[self.current_mode][1]()
 
+    def draw_cmds(self, out):
+        x, y = self.position.x, self.position.y
+        if not self.dead:
+            rot = {
+                "rotation": self.rotation,
+                "origin": (x + (Player.WIDTH * 0.5), y + (Player.HEIGHT * 0.5))
+            }
+            if self.current_mode == "square":
+                out.append(Draw.cmd(Draw.TEXTURE, int(x), int(y), Player.COLOR, Player.get_cube_sprite, **rot))
+            elif self.current_mode == "ship":
+                out.append(Draw.cmd(Draw.TEXTURE, int(x) - Player.WIDTH//4, int(y) - Player.HEIGHT//4, Player.COLOR, Player.get_ship_sprite, self.orientation, **rot))
+            elif self.current_mode == "ball":
+                out.append(Draw.cmd(Draw.TEXTURE, int(x - Player.BALL_SIZE//6), int(y - Player.BALL_SIZE//6), Player.COLOR, Player.get_ball_sprite, **rot))
+            else:
+                top = (x + Player.WIDTH//2, y + Player.HEIGHT - Spike.HEIGHT)
+                left = (top[0] - Spike.MID, top[1] + Spike.HEIGHT)
+                right = (top[0] + Spike.MID, top[1] + Spike.HEIGHT)
+                out.append(Draw.cmd(Draw.TRIANGLE, x, y, Player.COLOR, top, left, right, **rot))
+
+        if self.current_mode == "wave":
+            for (p1, p2) in pairwise(self.wave_points):
+                out.append(Draw.cmd(Draw.LINE, p1.x, p1.y, Player.WAVE_COLOR, (p2.x, p2.y), Player.WAVE_THICKNESS))
+
+            last = self.wave_points[-1]
+            if self.wantJump == (self.orientation == 1):
+                end = (x, y + Player.HEIGHT)
+            else:
+                end = (x, y)
+            out.append(Draw.cmd(Draw.LINE, last.x, last.y, Player.WAVE_COLOR, end, Player.WAVE_THICKNESS))
+
 class Ground(GameObj):
+    LAYER = RenderLayer.GROUND
     ALTITUDE = 300
     REVERSE_ALTITUDE = -10_000
 
@@ -774,6 +2566,7 @@ class Ground(GameObj):
     def __init__(self):
         super().__init__()
         self.position.y = Ground.ALTITUDE
+        self.width = 2_000
         self.always_think = True
         self.player = None
     
@@ -790,17 +2583,23 @@ class Ground(GameObj):
                 if not self.player.dead and self.player.position.y+Player.HEIGHT > Ground.ALTITUDE:
                     self.player.kill("Ground")
                 self.player.grounded_y = Ground.REVERSE_ALTITUDE
-        self.position.x = get_game().get_cam().target.x - 1_000
+        self.width = 2_000 / get_game().zoom # wider when the editor is zoomed out
+        self.position.x = get_game().get_cam().target.x - self.width / 2
     
     def draw(self):
         pos = VecMath.floor_i(self.position)
-        draw_rectangle(pos.x, pos.y, 2_000, 150, GRAY)
+        draw_rectangle(pos.x, pos.y, int(self.width), 150, GRAY)
+
+    def draw_cmds(self, out):
+        out.append(Draw.cmd(Draw.RECT, self.position.x, self.position.y, GRAY, self.width, 150))
 
 game = None
 def get_game():
     return game
     
 class Spike(GameObj):
+    LAYER = RenderLayer.HAZARDS
+    STATELESS = True
     WIDTH = 50
     HEIGHT = 50
     MID = 25
@@ -818,21 +2617,21 @@ class Spike(GameObj):
 
         self.position = position
 
-        self.origin = Vector2(self.position.x, self.position.y - Player.HEIGHT * 0.5)
+        self.origin = new_vec(self.position.x, self.position.y - Player.HEIGHT * 0.5)
         self.rotation = rotation
 
-        desired_pos = VecMath.sub(self.position, Vector2(5, 30))
+        desired_pos = new_vec(self.position.x - 5, self.position.y - 30)
         if rotation == 180:
             desired_pos.y -= Spike.MID-5
             
         self.area = Rect(
             desired_pos,
-            Vector2(10, 30)
+            new_vec(10, 30)
         )
         self.player = None
     
     def manifested(self):
-        self.player = get_game().find_by_tag("Player")
+        self.player = get_game().get_player()
     
     def logic(self):
         if self.player is None: return
@@ -865,6 +2664,14 @@ class Spike(GameObj):
             right,
             RED
         )
+
+    def draw_cmds(self, out):
+        x, y = self.position.x, self.position.y
+        out.append(Draw.cmd(
+            Draw.TRIANGLE, x, y, RED,
+            (x, y - Spike.HEIGHT), (x - Spike.MID, y), (x + Spike.MID, y),
+            rotation=self.rotation, origin=(self.origin.x, self.origin.y)
+        ))
     
     def postdraw(self):
         super().postdraw()
@@ -876,6 +2683,7 @@ class Spike(GameObj):
             
             draw_rectangle_lines(pos.x, pos.y, dim.x, dim.y, BLACK)
 class Tile(GameObj):
+    STATELESS = True
 
     def clone(self):
         return Tile(clone_vec(self.position), clone_vec(self.dim))
@@ -951,7 +2759,11 @@ class Tile(GameObj):
             d = VecMath.floor_i(d)
             draw_rectangle_lines(p.x, p.y, d.x, d.y, RED)
 
+    def draw_cmds(self, out):
+        out.append(Draw.cmd(Draw.RECT, self.position.x, self.position.y, DARKGRAY, self.dim.x, self.dim.y))
+
 class Slope(GameObj):
+    STATELESS = True
     MID = 25
 
     def clone(self):
@@ -1024,6 +2836,14 @@ class Slope(GameObj):
         v = VecMath.floor_i(VecMath.add(self.position, Vector2(0, 50)))
         
         draw_triangle_strip((v.to_raylib(), VecMath.int(VecMath.add(v, Vector2(50, 0))), VecMath.int(VecMath.add(v, Vector2(50, -50)))), 3, DARKGRAY)
+
+    def draw_cmds(self, out):
+        x, y = int(self.position.x), int(self.position.y + 50)
+        out.append(Draw.cmd(
+            Draw.TRIANGLE_STRIP, x, y, DARKGRAY,
+            (x, y), (x + 50, y), (x + 50, y - 50),
+            rotation=self.rotation, origin=(self.origin.x, self.origin.y)
+        ))
     
     def postdraw(self):
         super().postdraw()
@@ -1041,6 +2861,8 @@ class DebrisPart:
         self.direction = direction
 
 class Particle(GameObj):
+    LAYER = RenderLayer.PLAYER
+
     def __init__(self, debris):
         super().__init__()
         self.ready = False
@@ -1065,13 +2887,21 @@ class Particle(GameObj):
     def elapsed(self):
         return get_time() - self.start_time
     
+    def logic(self):
+        if self.ready:
+            for i in self.parts:
+                i.position = VecMath.add(i.position, i.direction)
+
     def draw(self):
         if self.ready:
             for i in self.parts:
                 v = VecMath.floor_i(i.position)
                 draw_rectangle(v.x, v.y, 10, 10, self.color)
-                
-                i.position = VecMath.add(i.position, i.direction)
+
+    def draw_cmds(self, out):
+        if self.ready:
+            for i in self.parts:
+                out.append(Draw.cmd(Draw.RECT, i.position.x, i.position.y, self.color, 10, 10))
 
 class TimerObj(GameObj):
     def __init__(self, duration, call_back):
@@ -1148,6 +2978,9 @@ class Orb(GameObj):
         draw_circle(p.x, p.y, self.radius, self.color)
         draw_circle_lines(p.x, p.y, self.radius+1, self.border_color)
 
+    def draw_cmds(self, out):
+        out.append(Draw.cmd(Draw.CIRCLE, self.position.x, self.position.y, self.color, self.radius, color_tuple(self.border_color)))
+
 class JumpOrb(Orb):
     STRENGTH = -22
     
@@ -1207,6 +3040,9 @@ class Pad(GameObj):
     def draw(self):
         p = VecMath.floor_i(self.position)
         draw_rectangle(p.x, p.y, Pad.WIDTH, Pad.HEIGHT, self.color)
+
+    def draw_cmds(self, out):
+        out.append(Draw.cmd(Draw.RECT, self.position.x, self.position.y, self.color, Pad.WIDTH, Pad.HEIGHT))
         
     def logic(self):
         if self.already_touched: return
@@ -1457,6 +3293,9 @@ class WinWall(GameObj):
         p = VecMath.floor_i(self.position)
         draw_rectangle(p.x, WinWall.Y_POS, WinWall.WIDTH, WinWall.HEIGHT, WinWall.COLOR)
 
+    def draw_cmds(self, out):
+        out.append(Draw.cmd(Draw.RECT, self.position.x, WinWall.Y_POS, WinWall.COLOR, WinWall.WIDTH, WinWall.HEIGHT))
+
 class PlayerSpawn(GameObj):
     RADIUS = 15
 
@@ -1499,6 +3338,9 @@ class PlayerSpawn(GameObj):
         p = VecMath.floor_i(self.position)
         draw_circle(p.x, p.y, PlayerSpawn.RADIUS, GRAY)
 
+    def draw_cmds(self, out):
+        out.append(Draw.cmd(Draw.CIRCLE, self.position.x, self.position.y, GRAY, PlayerSpawn.RADIUS, None))
+
 class Portal(GameObj):
     WIDTH = 10
     HEIGHT = 100
@@ -1539,6 +3381,9 @@ class Portal(GameObj):
     def draw(self):
         p = VecMath.floor_i(self.position)
         draw_rectangle(p.x, p.y, Portal.WIDTH, Portal.HEIGHT, self.color)
+
+    def draw_cmds(self, out):
+        out.append(Draw.cmd(Draw.RECT, self.position.x, self.position.y, self.color, Portal.WIDTH, Portal.HEIGHT))
     
     def postdraw(self):
         super().postdraw()
@@ -1602,8 +3447,7 @@ class DefaultSpeedPortal(Portal): # could be abstracted but whatever lmao
     @staticmethod
     def get_sprite():
         if DefaultSpeedPortal._SPRITE is None:
-            with RaylibImage(DefaultSpeedPortal.SPRITE_PATH) as image:
-                image_resize_nn(image, DefaultSpeedPortal.WIDTH, DefaultSpeedPortal.HEIGHT)
+            with RaylibImage(DefaultSpeedPortal.SPRITE_PATH, DefaultSpeedPortal.WIDTH, DefaultSpeedPortal.HEIGHT) as image:
                 DefaultSpeedPortal._SPRITE = load_texture_from_image(image)
 
         return DefaultSpeedPortal._SPRITE
@@ -1618,6 +3462,9 @@ class DefaultSpeedPortal(Portal): # could be abstracted but whatever lmao
     def draw(self):
         pos = VecMath.floor_i(self.position)
         draw_texture(DefaultSpeedPortal.get_sprite(), pos.x, pos.y, WHITE)
+
+    def draw_cmds(self, out):
+        out.append(Draw.cmd(Draw.TEXTURE, self.position.x, self.position.y, WHITE, DefaultSpeedPortal.get_sprite))
     
     def apply(self):
         get_game().get_player().horizontal_speed = DefaultSpeedPortal.SPEED
@@ -1634,8 +3481,7 @@ class FastSpeedPortal(Portal):
     @staticmethod
     def get_sprite():
         if FastSpeedPortal._SPRITE is None:
-            with RaylibImage(FastSpeedPortal.SPRITE_PATH) as image:
-                image_resize_nn(image, FastSpeedPortal.WIDTH, FastSpeedPortal.HEIGHT)
+            with RaylibImage(FastSpeedPortal.SPRITE_PATH, FastSpeedPortal.WIDTH, FastSpeedPortal.HEIGHT) as image:
                 FastSpeedPortal._SPRITE = load_texture_from_image(image)
 
         return FastSpeedPortal._SPRITE
@@ -1650,6 +3496,9 @@ class FastSpeedPortal(Portal):
     def draw(self):
         pos = VecMath.floor_i(self.position)
         draw_texture(FastSpeedPortal.get_sprite(), pos.x, pos.y, WHITE)
+
+    def draw_cmds(self, out):
+        out.append(Draw.cmd(Draw.TEXTURE, self.position.x, self.position.y, WHITE, FastSpeedPortal.get_sprite))
     
     def apply(self):
         get_game().get_player().horizontal_speed = FastSpeedPortal.SPEED
@@ -1666,8 +3515,7 @@ class VeryFastSpeedPortal(Portal):
     @staticmethod
     def get_sprite():
         if VeryFastSpeedPortal._SPRITE is None:
-            with RaylibImage(VeryFastSpeedPortal.SPRITE_PATH) as image:
-                image_resize_nn(image, VeryFastSpeedPortal.WIDTH, VeryFastSpeedPortal.HEIGHT)
+            with RaylibImage(VeryFastSpeedPortal.SPRITE_PATH, VeryFastSpeedPortal.WIDTH, VeryFastSpeedPortal.HEIGHT) as image:
                 VeryFastSpeedPortal._SPRITE = load_texture_from_image(image)
 
         return VeryFastSpeedPortal._SPRITE
@@ -1682,6 +3530,9 @@ class VeryFastSpeedPortal(Portal):
     def draw(self):
         pos = VecMath.floor_i(self.position)
         draw_texture(VeryFastSpeedPortal.get_sprite(), pos.x, pos.y, WHITE)
+
+    def draw_cmds(self, out):
+        out.append(Draw.cmd(Draw.TEXTURE, self.position.x, self.position.y, WHITE, VeryFastSpeedPortal.get_sprite))
     
     def apply(self):
         get_game().get_player().horizontal_speed = VeryFastSpeedPortal.SPEED
@@ -1699,8 +3550,7 @@ class FastestSpeedPortal(Portal):
     @staticmethod
     def get_sprite():
         if FastestSpeedPortal._SPRITE is None:
-            with RaylibImage(FastestSpeedPortal.SPRITE_PATH) as image:
-                image_resize_nn(image, FastestSpeedPortal.WIDTH, FastestSpeedPortal.HEIGHT)
+            with RaylibImage(FastestSpeedPortal.SPRITE_PATH, FastestSpeedPortal.WIDTH, FastestSpeedPortal.HEIGHT) as image:
                 FastestSpeedPortal._SPRITE = load_texture_from_image(image)
 
         return FastestSpeedPortal._SPRITE
@@ -1715,11 +3565,22 @@ class FastestSpeedPortal(Portal):
     def draw(self):
         pos = VecMath.floor_i(self.position)
         draw_texture(FastestSpeedPortal.get_sprite(), pos.x, pos.y, WHITE)
+
+    def draw_cmds(self, out):
+        out.append(Draw.cmd(Draw.TEXTURE, self.position.x, self.position.y, WHITE, FastestSpeedPortal.get_sprite))
     
     def apply(self):
         get_game().get_player().horizontal_speed = FastestSpeedPortal.SPEED
 
 
+# everything a level file is allowed to contain, see LevelParser
+LEVEL_TYPES = {cls.__name__: cls for cls in (
+    Player, Ground, Spike, Tile, Slope, JumpOrb, GravityOrb, JumpPad, GravityPad,
+    CameraResetTrigger, CameraStaticTrigger, CameraYTrigger, BackgroundChangeTrigger,
+    WinWall, PlayerSpawn, ShipPortal, SquarePortal, BallPortal, WavePortal,
+    DefaultSpeedPortal, FastSpeedPortal, VeryFastSpeedPortal, FastestSpeedPortal
+)}
+
 class Item:
     def __init__(self, name):
         self.name = name
@@ -2101,43 +3962,348 @@ class WinWallItem(Item):
         return WinWall(where)
 
 
-class EditorLevelPreview(GameObj):
-    def __repr__(self):
-        return "EditorLevelPreview(?)"
+class EditorLevelPreview(GameObj):
+    def __repr__(self):
+        return "EditorLevelPreview(?)"
+
+    def get_tag(self):
+        return "Preview"
+
+    def clone(self):
+        return EditorLevelPreview(self.editor)
+
+    def __init__(self, editor):
+        super().__init__()
+        self.editor = editor
+        self.always_think = True
+    
+    def return_to_editor(self):
+        def get_editor_objs():
+            # the objects from before the test play, nothing was changed on them
+            return self.editor.playing + [self.editor]
+
+        l = Level(get_game().get_level().name, get_editor_objs)
+        get_game().defer(lambda: get_game().set_level(EditorLevel(l)))
+
+    def logic(self):
+        if Input.preview_toggled():
+            self.return_to_editor()
+
+class SpatialHash:
+    """
+    Uniform grid over the areas of the objects in the editor, so picking, box selection & overlap checks only
+    look at the objects near a point instead of the whole level. Objects bigger than a cell are put in every
+    cell they touch. While it's set as Game.spatial, make() & destroy() keep it up to date.
+    """
+    CELL = 100
+
+    def __init__(self, objs=()):
+        self.cells = {} # (cell x, cell y) -> {obj: None}, dicts so results come out in the same order every time
+        self.placed = {} # obj -> the cells it's in
+        self.order = {} # obj -> when it was added, so picks find the same object a loop over game_objects would
+        self.serial = 0
+        self.touched = set() # every cell something was added to or removed from, see LevelLOD
+        self.add_all(objs)
+
+    @staticmethod
+    def cell_ranges(x0, y0, x1, y1):
+        c = SpatialHash.CELL
+        return range(math.floor(x0 / c), math.floor(x1 / c) + 1), range(math.floor(y0 / c), math.floor(y1 / c) + 1)
+
+    def add(self, obj):
+        self.add_all((obj,))
+
+    def add_all(self, objs):
+        # add() for a lot of objects at once, the lookups are done once instead of for every object
+        c = SpatialHash.CELL
+        cells, placed, order, touched = self.cells, self.placed, self.order, self.touched
+        floor = math.floor
+        for obj in objs:
+            area = obj.area
+            if area is None or obj in placed:
+                continue
+            p, d = area.position, area.dimension
+            x0, y0 = floor(p.x / c), floor(p.y / c)
+            x1, y1 = floor((p.x + d.x) / c), floor((p.y + d.y) / c)
+            if x0 == x1 and y0 == y1:
+                keys = [(x0, y0)]
+            else:
+                keys = [(x, y) for x in range(x0, x1 + 1) for y in range(y0, y1 + 1)]
+            touched.update(keys)
+            for k in keys:
+                cell = cells.get(k)
+                if cell is None:
+                    cell = cells[k] = {}
+                cell[obj] = None
+            placed[obj] = keys
+            self.serial += 1
+            order[obj] = self.serial
+
+    def remove(self, obj):
+        keys = self.placed.pop(obj, None)
+        if keys is None:
+            return
+        for k in keys:
+            cell = self.cells[k]
+            del cell[obj]
+            if not cell:
+                del self.cells[k]
+        self.touched.update(keys)
+        del self.order[obj]
+
+    def bounds(self):
+        # (x0, y0, x1, y1) around every cell in use, or None when it's empty
+        if not self.cells:
+            return None
+        xs = [k[0] for k in self.cells]
+        ys = [k[1] for k in self.cells]
+        c = SpatialHash.CELL
+        return min(xs) * c, min(ys) * c, (max(xs) + 1) * c, (max(ys) + 1) * c
+
+    def pick(self, point):
+        # the first object whose area has the point in it, or None
+        c = SpatialHash.CELL
+        cell = self.cells.get((math.floor(point.x / c), math.floor(point.y / c)), ())
+        hits = []
+        for o in cell:
+            p, d = o.area.position, o.area.dimension # the same test as Rect.check_collision_with_point, without the copies
+            if p.x <= point.x <= p.x + d.x and p.y <= point.y <= p.y + d.y:
+                hits.append(o)
+        return min(hits, key=self.order.get, default=None)
+
+    def query(self, x0, y0, x1, y1):
+        # every object whose area overlaps the box, oldest first
+        xs, ys = SpatialHash.cell_ranges(min(x0, x1), min(y0, y1), max(x0, x1), max(y0, y1))
+        if len(xs) * len(ys) > len(self.cells): # a box bigger than the level, looking at the used cells is quicker
+            cells = [cell for (x, y), cell in self.cells.items() if x in xs and y in ys]
+        else:
+            cells = [self.cells[(x, y)] for x in xs for y in ys if (x, y) in self.cells]
+
+        x0, x1 = sorted((x0, x1))
+        y0, y1 = sorted((y0, y1))
+        found = {}
+        for cell in cells:
+            for o in cell:
+                p, d = o.area.position, o.area.dimension
+                if p.x <= x1 and p.x + d.x >= x0 and p.y <= y1 and p.y + d.y >= y0:
+                    found[o] = None
+        return sorted(found, key=self.order.get)
+
+    def duplicate_of(self, obj):
+        # an object that's already there & exactly the same as obj (same type & saved the same), or None
+        if obj.area is None:
+            return None
+        c = SpatialHash.CELL
+        p = obj.area.position
+        text = repr(obj)
+        for o in self.cells.get((math.floor(p.x / c), math.floor(p.y / c)), ()):
+            if type(o) is type(obj) and o is not obj and repr(o) == text:
+                return o
+        return None
+
+class LevelLOD:
+    """
+    What the editor draws when it's zoomed out too far to draw every object. The level is split into chunks of
+    CHUNK_COLUMNS SpatialHash columns, each chunk keeps the cells its objects cover at a few sizes (GRID, then
+    doubled LEVELS-1 times) merged into rows of rectangles. Zoomed out, each screen pixel covers so much that one
+    rectangle for a row of tiles looks the same as the tiles, and the rectangle count doesn't grow with the zoom.
+    Big objects are kept as their own rectangle instead. Edits only rebuild the chunks they touched (see
+    SpatialHash.touched).
+    """
+    ZOOM = 0.5 # the editor switches to this below this zoom
+    GRID = 50
+    LEVELS = 5
+    PIXELS = 4 # smallest size a cell is drawn at on screen, picks the level
+    BIG = 16 # objects covering more cells than this are drawn as themselves (like the win wall), over the cells
+    CHUNK_COLUMNS = 10
+    CHUNKS_PER_UPDATE = 16 # built each frame at most, so zooming out on a huge level doesn't freeze the editor
+    SOLID, OTHER, HAZARD = 1, 2, 3 # what a cell shows, the higher one wins when two objects share a cell
+    COLORS = {SOLID: DARKGRAY, OTHER: BLUE, HAZARD: RED}
+
+    def __init__(self):
+        self.chunks = {} # chunk x -> [[(x, y, width, height, kind), ...] for each level]
+        self.cells = {} # chunk x -> the SpatialHash cells in it that are in use
+        self.pending = set() # chunks that changed but haven't been built again yet
+
+    @staticmethod
+    def kind(obj):
+        if isinstance(obj, Spike):
+            return LevelLOD.HAZARD
+        if isinstance(obj, (Tile, Slope)):
+            return LevelLOD.SOLID
+        return LevelLOD.OTHER
+
+    @staticmethod
+    def chunk_width():
+        return LevelLOD.CHUNK_COLUMNS * SpatialHash.CELL
+
+    def update(self, spatial, x):
+        # takes the changes since the last update, then builds the changed chunks closest to x
+        for k in spatial.touched:
+            c = k[0] // LevelLOD.CHUNK_COLUMNS
+            keys = self.cells.setdefault(c, set())
+            if k in spatial.cells:
+                keys.add(k)
+            else:
+                keys.discard(k)
+            self.pending.add(c)
+        spatial.touched.clear()
+        if not self.pending:
+            return
+        w = LevelLOD.chunk_width()
+        for c in sorted(self.pending, key=lambda c: abs(c * w - x))[:LevelLOD.CHUNKS_PER_UPDATE]:
+            self.pending.discard(c)
+            objs = {}
+            for k in self.cells[c]:
+                objs.update(spatial.cells[k])
+            if objs:
+                self.chunks[c] = LevelLOD.build(c, objs)
+            else:
+                self.chunks.pop(c, None)
+                del self.cells[c]
 
-    def get_tag(self):
-        return "Preview"
+    @staticmethod
+    def build(c, objs):
+        g = LevelLOD.GRID
+        x_start = c * LevelLOD.chunk_width()
+        x_end = x_start + LevelLOD.chunk_width()
+        grid = {}
+        big = []
+        for o in objs:
+            p, d = o.area.position, o.area.dimension
+            k = LevelLOD.kind(o)
+            gx0 = math.floor(max(p.x, x_start) / g)
+            gx1 = max(gx0, math.ceil(min(p.x + d.x, x_end) / g) - 1)
+            gy0 = math.floor(p.y / g)
+            gy1 = max(gy0, math.ceil((p.y + d.y) / g) - 1)
+            if (gx1 - gx0 + 1) * (gy1 - gy0 + 1) > LevelLOD.BIG:
+                x = max(p.x, x_start)
+                big.append((int(x), int(p.y), max(1, int(min(p.x + d.x, x_end) - x)), max(1, int(d.y)), k))
+                continue
+            for gx in range(gx0, gx1 + 1):
+                for gy in range(gy0, gy1 + 1):
+                    if grid.get((gx, gy), 0) < k:
+                        grid[(gx, gy)] = k
+
+        levels = []
+        size = g
+        for _ in range(LevelLOD.LEVELS):
+            levels.append(big + LevelLOD.merge_rows(grid, size))
+            coarse = {}
+            for (gx, gy), k in grid.items():
+                key = (gx >> 1, gy >> 1)
+                if coarse.get(key, 0) < k:
+                    coarse[key] = k
+            grid = coarse
+            size *= 2
+        return levels
 
-    def clone(self):
-        return EditorLevelPreview(self.editor)
+    @staticmethod
+    def merge_rows(grid, size):
+        # cells next to each other in a row with the same kind become one rectangle
+        rects = []
+        run = None # [x, y, cells, kind]
+        for gx, gy in sorted(grid, key=lambda k: (k[1], k[0])):
+            k = grid[(gx, gy)]
+            if run is not None and run[1] == gy and run[0] + run[2] == gx and run[3] == k:
+                run[2] += 1
+                continue
+            if run is not None:
+                rects.append((run[0] * size, run[1] * size, run[2] * size, size, run[3]))
+            run = [gx, gy, 1, k]
+        if run is not None:
+            rects.append((run[0] * size, run[1] * size, run[2] * size, size, run[3]))
+        return rects
 
-    def __init__(self, editor):
-        super().__init__()
-        self.editor = editor
-        self.always_think = True
-    
-    def return_to_editor(self):
-        def get_editor_objs():
-            objs = self.editor.get_saved()
-            for i in objs[:]:
-                if i.get_tag() == "Player" or i.get_tag() == "Preview":
-                    objs.remove(i)
-                    
-            objs.append(self.editor)
-            return objs
+    @staticmethod
+    def level_for(zoom):
+        size = LevelLOD.GRID
+        for level in range(LevelLOD.LEVELS):
+            if size * zoom >= LevelLOD.PIXELS:
+                return level
+            size *= 2
+        return LevelLOD.LEVELS - 1
+
+    def rects(self, x0, x1, zoom):
+        # the rectangles to draw for the part of the level between x0 & x1
+        level = LevelLOD.level_for(zoom)
+        w = LevelLOD.chunk_width()
+        out = []
+        for c in range(math.floor(x0 / w), math.floor(x1 / w) + 1):
+            chunk = self.chunks.get(c)
+            if chunk is not None:
+                out += chunk[level]
+        return out
+
+    def draw(self, x0, x1, zoom):
+        colors = LevelLOD.COLORS
+        for x, y, w, h, k in self.rects(x0, x1, zoom):
+            draw_rectangle(x, y, w, h, colors[k])
+
+EditorEdit = namedtuple("EditorEdit", "name removed added") # one step of EditorHistory, the objects it took out & put in
+
+class EditorHistory:
+    """
+    Undo & redo for the editor. Every change is logged as the objects it removed from the level & the ones it
+    added (placing only adds, deleting only removes, moving removes the old objects & adds moved copies), so
+    the log holds just the objects that were edited and undoing a step only touches those.
+    """
+    LIMIT = 1000 # steps, the oldest are forgotten after this
 
-        l = Level(get_game().get_level().name, get_editor_objs)
-        get_game().defer(lambda: get_game().set_level(EditorLevel(l)))
+    def __init__(self):
+        self.undo_stack = []
+        self.redo_stack = []
 
-    def logic(self):
-        if is_key_pressed(KeyboardKey(0).KEY_T):
-            self.return_to_editor()
+    def do(self, name, removed=(), added=()):
+        # applies an edit to the level and logs it
+        edit = EditorEdit(name, list(removed), list(added))
+        if not edit.removed and not edit.added:
+            return
+        EditorHistory.apply(edit.removed, edit.added)
+        self.undo_stack.append(edit)
+        if len(self.undo_stack) > EditorHistory.LIMIT:
+            del self.undo_stack[0]
+        self.redo_stack.clear()
+
+    @staticmethod
+    def apply(removed, added):
+        if removed:
+            get_game().destroy(removed)
+        if added:
+            get_game().make(added)
+
+    def undo(self):
+        if not self.undo_stack:
+            print("Nothing to undo")
+            return None
+        edit = self.undo_stack.pop()
+        EditorHistory.apply(edit.added, edit.removed)
+        self.redo_stack.append(edit)
+        print(f"Undid {edit.name}")
+        return edit
+
+    def redo(self):
+        if not self.redo_stack:
+            print("Nothing to redo")
+            return None
+        edit = self.redo_stack.pop()
+        EditorHistory.apply(edit.removed, edit.added)
+        self.undo_stack.append(edit)
+        print(f"Redid {edit.name}")
+        return edit
 
 class EditorLevelManager(GameObj):
+    LAYER = RenderLayer.EDITOR_OVERLAY
     ROUND_WIDTH = -1
     CAM_SPEED = 10
+    ARRAY_COUNT = 10 # copies the array fill makes to begin with, [ & ] change it
+    MIN_ZOOM = 0.01
+    MAX_ZOOM = 2
+    ZOOM_STEP = 1.25 # per notch of the mouse wheel
 
     class SaveUIGroup(GameObj):
+        LAYER = RenderLayer.SCREEN_UI
+
         def __init__(self):
             super().__init__()
             self.elements = [
@@ -2149,6 +4315,7 @@ class EditorLevelManager(GameObj):
             self.elements[0].text = get_game().get_level().name
             self.done = False
             self.always_think = True
+            self.saver = None
         
         def destroyed(self):
             self.done = True
@@ -2166,25 +4333,27 @@ class EditorLevelManager(GameObj):
             
             if not os.path.exists("./custom_levels/"):
                 os.mkdir("./custom_levels/")
-            
-            level_data = repr(get_game().find_by_tag("editor_manager").get_actual_saved())
 
-            with open(desired_file_name, "w") as f:
-                f.write(name + "\n")
-                f.write(level_data)
-            
-            get_game().defer(lambda: get_game().destroy([self]))
+            self.saver = LevelSaver(desired_file_name, name, get_game().find_by_tag("editor_manager").snapshot())
+            self.saver.start()
 
         def get_tag(self):
             return "editor_ui_group"
 
-        def is_ui_element(self):
-            return True
 
         def logic(self):
             if self.visible:
                 for i in self.elements:
                     i.logic()
+            elif self.saver is not None and self.saver.done:
+                if self.saver.error is not None:
+                    sys.stderr.write(f"Failed to save '{self.saver.path}': {self.saver.error}\n")
+                else:
+                    print(f"Saved level to '{self.saver.path}' ({len(self.saver.objs)} objects)")
+                    # what's in the file now is what's in the editor, changes after this get reloaded
+                    get_game().find_by_tag("editor_manager").watch(self.saver.path)
+                self.saver = None
+                get_game().defer(lambda: get_game().destroy([self]))
 
         def ui_draw(self):
             if self.visible:
@@ -2192,9 +4361,13 @@ class EditorLevelManager(GameObj):
                     i.ui_draw()
             else:
                 self.elements[0].selected = False
+                progress = 0 if self.saver is None else self.saver.progress
                 draw_text("Saving ...", get_screen_width()//2, 100, 44, BLACK)
+                draw_rectangle(get_screen_width()//2, 155, int(progress * 300), 20, BLUE)
+                draw_rectangle_lines(get_screen_width()//2, 155, 300, 20, DARKBLUE)
     
     class HUD(GameObj):
+        LAYER = RenderLayer.SCREEN_UI
 
         def __init__(self):
             super().__init__()
@@ -2206,8 +4379,6 @@ class EditorLevelManager(GameObj):
         def manifested(self):
             self.manager = get_game().find_by_tag("editor_manager")
 
-        def is_ui_element(self):
-            return True
         
         def ui_draw(self):
             if self.manager is None:
@@ -2219,8 +4390,13 @@ class EditorLevelManager(GameObj):
             if self.manager.held_item is not None:
                 text = self.manager.held_item.name
                 draw_text(text, get_screen_width()//2 - measure_text(text, 24)//2, 5, 24, BLACK)
+            if self.manager.selected:
+                text = f"{len(self.manager.selected)} selected, F fills {self.manager.array_count} copies"
+                draw_text(text, get_screen_width()//2 - measure_text(text, 24)//2, 35, 24, BLACK)
 
             draw_text(f"{round(cam.target.x, 2)}, {round(cam.target.y, 2)}", 10, 5, 54, BLACK )
+            if self.manager.zoom != 1:
+                draw_text(f"zoom {round(self.manager.zoom * 100)}%", 10, 60, 24, BLACK)
             draw_fps(get_screen_width() - 100, 20)
 
             if self.manager.esc_tick > 0:
@@ -2256,8 +4432,34 @@ class EditorLevelManager(GameObj):
         self.esc_tick = 0
 
         self.save_window = None
+
+        self.selected = [] # box selected objects
+        self.box_start = None # world position the box select drag started at
+        self.history = EditorHistory()
+        self.playing = [] # the editor's objects while the level is test played
+        self.clipboard = [] # LevelSpecs of the copied objects, positioned from (0, 0)
+        self.array_count = EditorLevelManager.ARRAY_COUNT
+        self.zoom = 1
+        self.unfit = None # (camera target, zoom) from before Home zoomed out to the whole level
+        self.watcher = None # LevelWatcher of the file being edited
+        self.lod = LevelLOD()
+        self.spatial = None # the SpatialHash of the editor's objects kept while test playing
     
     def manifested(self):
+        spatial, self.spatial = self.spatial, None
+        if spatial is None:
+            spatial = SpatialHash(get_game().game_objects)
+            self.lod = LevelLOD()
+        else:
+            # back from a test play, the objects are the same ones so only what the level added or dropped changes
+            objs = set(get_game().game_objects)
+            for i in [i for i in spatial.placed if i not in objs]:
+                spatial.remove(i)
+            for i in get_game().game_objects:
+                spatial.add(i)
+        get_game().spatial = spatial
+        if self.watcher is None: # coming back from a test play keeps the one it had
+            self.watch(get_game().get_level().source)
         if get_game().find_by_tag("editor_hud") is None:
             self.hud = EditorLevelManager.HUD()
             get_game().make([self.hud])
@@ -2265,14 +4467,48 @@ class EditorLevelManager(GameObj):
     def get_saved(self):
         return [o.clone() for o in self.saved]
 
+    def watch(self, path):
+        self.watcher = LevelWatcher.start(path)
+
+    def hot_reload(self, removed, added):
+        # the changes to the file go in as one edit, so they can be undone like any other
+        objs = [i for i in get_game().game_objects if EditorLevelManager.is_saved(i)]
+        gone = LevelWatcher.find(objs, removed)
+        with GCPaused():
+            made = LevelParser.instantiate(added)
+            self.history.do(f"reload of {os.path.basename(self.watcher.path)}", gone, made)
+        print(f"Reloaded '{self.watcher.path}': {len(gone)} objects removed, {len(made)} added")
+
+    @staticmethod
+    def is_saved(obj):
+        return not (type(obj) == EditorLevelManager or obj.get_tag().startswith("editor") or isinstance(obj, Background))
+
     def save_objs(self):
         self.saved.clear()
         for i in get_game().game_objects:
-            if type(i) == EditorLevelManager or i.get_tag().startswith("editor") or isinstance(i, Background):
-                continue
-            self.saved.append(i.clone())        
+            if EditorLevelManager.is_saved(i):
+                self.saved.append(i.clone())
+
+    def snapshot(self):
+        # the same objects get_actual_saved() gives, without cloning them (see LevelSaver)
+        objs = [i for i in get_game().game_objects if EditorLevelManager.is_saved(i)]
+        if not any(type(i) == Player for i in objs):
+            objs.insert(0, Player())
+        return tuple(objs)
+
+    def optimize(self):
+        # runs LevelOptimizer over the placed objects & swaps in the result
+        objs = [i for i in get_game().game_objects if EditorLevelManager.is_saved(i)]
+        specs, removed = LevelOptimizer.optimize(LevelParser(repr(objs), "editor").parse())
+        if not removed:
+            print("Nothing to optimize")
+            return
+        self.history.do("optimize", objs, LevelParser.instantiate(specs))
+        print(f"Optimized level, {len(objs)} -> {len(specs)} objects (" + ", ".join(f"{n} {t}" for t, n in sorted(removed.items())) + " removed)")
 
     def pick_item(self):
+        if is_key_down(KeyboardKey(0).KEY_LEFT_CONTROL): # zooms instead
+            return
         mouse_wheel = round(get_mouse_wheel_move())
         if mouse_wheel != 0:
             self.held_item_index += mouse_wheel
@@ -2286,9 +4522,9 @@ class EditorLevelManager(GameObj):
     def cam_move(self):
         cam = get_game().get_cam()
         
-        speed_mul = 1
+        speed_mul = 1 / self.zoom # the same speed on screen at any zoom
         if is_key_down(KeyboardKey(0).KEY_LEFT_SHIFT):
-            speed_mul = 2
+            speed_mul *= 2
 
         if is_key_down(KeyboardKey(0).KEY_D):
             cam.target.x += EditorLevelManager.CAM_SPEED * speed_mul
@@ -2300,6 +4536,47 @@ class EditorLevelManager(GameObj):
         elif is_key_down(KeyboardKey(0).KEY_S):
             cam.target.y += EditorLevelManager.CAM_SPEED * speed_mul
 
+    def zoom_cam(self):
+        # ctrl + mouse wheel zooms around the mouse, Home shows the whole level
+        if is_key_pressed(KeyboardKey(0).KEY_HOME):
+            self.fit_level()
+            return
+        wheel = get_mouse_wheel_move() if is_key_down(KeyboardKey(0).KEY_LEFT_CONTROL) else 0
+        if wheel == 0:
+            return
+        cam = get_game().get_cam()
+        zoom = min(max(self.zoom * EditorLevelManager.ZOOM_STEP ** wheel, EditorLevelManager.MIN_ZOOM), EditorLevelManager.MAX_ZOOM)
+        before = get_screen_to_world_2d(get_mouse_position(), cam)
+        self.set_zoom(zoom)
+        after = get_screen_to_world_2d(get_mouse_position(), cam)
+        cam.target.x += before.x - after.x
+        cam.target.y += before.y - after.y
+        self.unfit = None
+
+    def set_zoom(self, zoom):
+        cam = get_game().get_cam()
+        cam.zoom = get_screen_width() / screen_width * zoom # the same as main() sets it to
+        self.zoom = zoom
+        get_game().zoom = zoom
+
+    def fit_level(self):
+        # pressing Home again goes back to where the camera was
+        cam = get_game().get_cam()
+        if self.unfit is not None:
+            target, zoom = self.unfit
+            self.unfit = None
+        else:
+            bounds = get_game().spatial.bounds()
+            if bounds is None:
+                return
+            x0, y0, x1, y1 = bounds
+            self.unfit = (clone_vec(cam.target), self.zoom)
+            # fits the length, levels are a lot longer than they are tall (apart from the win wall)
+            zoom = min(max(screen_width / (x1 - x0) * 0.9, EditorLevelManager.MIN_ZOOM), 1)
+            target = Vector2((x0 + x1) / 2, Ground.ALTITUDE + 150 - screen_height / zoom / 2) # the ground at the bottom
+        cam.target = target
+        self.set_zoom(zoom)
+
     @staticmethod
     def get_desired_mouse_pos():
         # pos = VecMath.sub(get_mouse_position(), VecMath.sub(cam.offset, cam.target))
@@ -2349,71 +4626,89 @@ class EditorLevelManager(GameObj):
         elif is_key_released(KeyboardKey(0).KEY_ESCAPE):
             self.esc_tick = 0
 
+        if self.watcher is not None and (change := self.watcher.poll()) is not None:
+            self.hot_reload(*change)
+
         self.pick_item()
+        self.zoom_cam()
         self.cam_move()
+        get_game().zoom = self.zoom
+        get_game().overview = self.zoom < LevelLOD.ZOOM
+        if get_game().overview:
+            self.lod.update(get_game().spatial, get_game().get_cam().target.x)
 
         if is_key_pressed(KeyboardKey(0).KEY_T):
-            get_game().set_editor_mode(False)
-            objs = [EditorLevelPreview(self), Player()]
-            self.save_objs()
-            for i in self.saved:
-                objs.append(i)
-            self.saved = objs
-
-            print("SAVED LEVEL CODE: -=-=-=-=-=")
-            print(self.saved)
-            print("LEVEL CODE ^^^^^^^-=-=-=-=-=")
-            test_level = Level(get_game().get_level().name, self.get_saved)
-            get_game().defer(lambda: get_game().set_level(test_level))
+            self.test_play()
 
         pos = EditorLevelManager.get_desired_mouse_pos()
         
         if is_key_pressed(KeyboardKey(0).KEY_P):
             for i in get_game().game_objects[:]:
                 if type(i) == WinWall:
-                    get_game().game_objects.remove(i)
+                    self.history.do("remove win wall", [i])
                     break
 
-        if is_key_pressed(KeyboardKey(0).KEY_C):
+        if is_key_down(KeyboardKey(0).KEY_LEFT_CONTROL):
+            redo = is_key_pressed(KeyboardKey(0).KEY_Y) or (is_key_pressed(KeyboardKey(0).KEY_Z) and is_key_down(KeyboardKey(0).KEY_LEFT_SHIFT))
+            if redo or is_key_pressed(KeyboardKey(0).KEY_Z):
+                edit = self.history.redo() if redo else self.history.undo()
+                # a moved selection follows the objects back & forth
+                if edit is not None and self.selected and not self.alive_selection():
+                    self.selected = edit.added if redo else edit.removed
+
+            if is_key_pressed(KeyboardKey(0).KEY_C) and self.selected:
+                self.copy_selection()
+            if is_key_pressed(KeyboardKey(0).KEY_V) and self.clipboard:
+                self.paste(pos)
+
+        elif is_key_pressed(KeyboardKey(0).KEY_C):
             print("Saving level to clipboard ...")
-            saved = self.get_actual_saved()
-            set_clipboard_text(repr(saved))
-            print(f"Saved level to clipboard! ({len(saved)} objects)")
+            saved = self.snapshot()
+            if is_key_down(KeyboardKey(0).KEY_LEFT_SHIFT): # the level code, like the .level files have
+                text = repr(list(saved))
+            else:
+                text = ClipboardLevel.dump(get_game().get_level().name, saved)
+            set_clipboard_text(text)
+            print(f"Saved level to clipboard! ({len(saved)} objects, {len(text)} characters)")
 
         if is_key_pressed(KeyboardKey(0).KEY_L):
             print("Loading level from clipboard ...")
             clip = get_clipboard_text()
             objs = None
             try:
-                objs = eval(clip)
-            except:
-                sys.stderr.write("Invalid level data! Please ensure you copied the right stuff\n")
+                objs = ClipboardLevel.load(clip)
+            except LevelParseError as e:
+                sys.stderr.write(f"Invalid level data! Please ensure you copied the right stuff\n{e}\n")
             else:
-                if type(objs) is not list:
-                    sys.stderr.write("Evaluated 'level' is not a list and therefore, not a level.\n")
-                else: 
-                    for i in objs[:]:
-                        if type(i) in [Player, EditorLevelPreview, EditorLevelManager]:
-                            objs.remove(i)
-                    objs.insert(0, EditorLevelManager())
-
-                    def level_data():
-                        return objs
-                    l = Level("Loaded Level", level_data)
-                    get_game().defer(lambda: get_game().set_level(l))
-                    print("Loaded level!")
+                for i in objs[:]:
+                    if type(i) is Player:
+                        objs.remove(i)
+                objs.insert(0, EditorLevelManager())
+
+                def level_data():
+                    return objs
+                l = Level("Loaded Level", level_data)
+                get_game().defer(lambda: get_game().set_level(l))
+                print("Loaded level!")
 
         if is_key_pressed(KeyboardKey(0).KEY_B):
             global DEBUG_MODE
             DEBUG_MODE = not DEBUG_MODE
 
         if is_key_pressed(KeyboardKey(0).KEY_K):
-            removed = 0
-            for i in get_game().game_objects[:]:
-                if type(i) == PlayerSpawn:
-                    get_game().game_objects.remove(i)
-                    removed += 1
-            print(f"Removed {removed} spawnpoints")
+            spawns = [i for i in get_game().game_objects if type(i) == PlayerSpawn]
+            self.history.do("remove spawnpoints", spawns)
+            print(f"Removed {len(spawns)} spawnpoints")
+
+        if is_key_pressed(KeyboardKey(0).KEY_O):
+            self.optimize()
+
+        if is_key_pressed(KeyboardKey(0).KEY_RIGHT_BRACKET):
+            self.array_count += 1
+        elif is_key_pressed(KeyboardKey(0).KEY_LEFT_BRACKET):
+            self.array_count = max(1, self.array_count - 1)
+        if is_key_pressed(KeyboardKey(0).KEY_F) and self.selected:
+            self.array_fill(pos)
 
         if self.held_item is not None:
             actual = self.held_item.offset(pos)
@@ -2421,19 +4716,18 @@ class EditorLevelManager(GameObj):
 
             if is_mouse_button_down(1):
                 point = get_screen_to_world_2d(get_mouse_position(), get_game().get_cam())
-                for i in get_game().game_objects:
-                    if i.area is None: continue
-
-                    if Rect.check_collision_with_point(i.area, point):
-                        get_game().game_objects.remove(i)
-                        break
+                hit = get_game().spatial.pick(point)
+                if hit is not None:
+                    self.history.do(f"delete {type(hit).__name__}", [hit])
 
             if is_mouse_button_pressed(0):
                 block = self.held_item.place(actual, self.rotation)
                 if block is None:
                     sys.stderr.write("Attempted to place nothing (None).\n")
+                elif get_game().spatial.duplicate_of(block) is not None:
+                    print(f"There's already a {type(block).__name__} there")
                 else:
-                    get_game().make([block])
+                    self.history.do(f"place {type(block).__name__}", (), [block])
             
             if is_mouse_button_pressed(2):
                 self.held_item.special_trigger()
@@ -2442,9 +4736,123 @@ class EditorLevelManager(GameObj):
                 self.rotation += 45
                 if self.rotation > 315:
                     self.rotation = 0
+        else:
+            self.box_select()
+
+        if is_key_pressed(KeyboardKey(0).KEY_DELETE) and self.selected:
+            alive = self.alive_selection()
+            self.history.do(f"delete {len(alive)} objects", alive)
+            print(f"Deleted {len(alive)} objects")
+            self.selected = []
+
+        step = 50 if is_key_down(KeyboardKey(0).KEY_LEFT_SHIFT) else 10
+        for key, dx, dy in ((KeyboardKey(0).KEY_LEFT, -step, 0), (KeyboardKey(0).KEY_RIGHT, step, 0), (KeyboardKey(0).KEY_UP, 0, -step), (KeyboardKey(0).KEY_DOWN, 0, step)):
+            if is_key_pressed(key) and self.selected:
+                self.move_selection(dx, dy)
+
+    def test_play(self):
+        # plays the editor's own objects, only the ones that change while playing get copied (see GameObj.STATELESS)
+        # so coming back to the editor doesn't have to rebuild anything
+        get_game().set_editor_mode(False)
+        self.playing = [i for i in get_game().game_objects if EditorLevelManager.is_saved(i)]
+        self.spatial = get_game().spatial
+        if DEBUG_MODE:
+            print("SAVED LEVEL CODE: -=-=-=-=-=")
+            print(self.playing)
+            print("LEVEL CODE ^^^^^^^-=-=-=-=-=")
+        test_level = Level(get_game().get_level().name, self.play_objects)
+        get_game().defer(lambda: get_game().set_level(test_level))
+
+    def play_objects(self):
+        # every attempt gets fresh copies of the objects that change
+        return [EditorLevelPreview(self), Player()] + [i if i.STATELESS else i.clone() for i in self.playing]
+
+    def alive_selection(self):
+        # the selected objects that haven't been deleted (or undone) since
+        return [i for i in self.selected if i in get_game().spatial.placed]
+
+    @staticmethod
+    def shifted(specs, dx, dy):
+        # the specs moved by (dx, dy), an object's position is its first Vector2
+        out = []
+        for s in specs:
+            if s.args and type(s.args[0]) is V2:
+                s = LevelSpec(s.type, (V2(s.args[0].x + dx, s.args[0].y + dy),) + s.args[1:])
+            out.append(s)
+        return out
+
+    @staticmethod
+    def origin_of(specs):
+        # the top left of the positions of the specs
+        points = [s.args[0] for s in specs if s.args and type(s.args[0]) is V2]
+        if not points:
+            return V2(0, 0)
+        return V2(min(p.x for p in points), min(p.y for p in points))
+
+    @staticmethod
+    def moved(objs, dx, dy):
+        # copies of objs moved by (dx, dy), built from their saved form like everything else
+        return LevelParser.instantiate(EditorLevelManager.shifted(LevelParser(repr(objs), "editor").parse(), dx, dy))
+
+    def copy_selection(self):
+        specs = LevelParser(repr(self.alive_selection()), "editor").parse()
+        origin = EditorLevelManager.origin_of(specs)
+        self.clipboard = EditorLevelManager.shifted(specs, -origin.x, -origin.y)
+        print(f"Copied {len(self.clipboard)} objects")
+
+    def paste(self, pos):
+        # the copied objects with their top left at pos, all made at once & undone as one step
+        with GCPaused():
+            objs = LevelParser.instantiate(EditorLevelManager.shifted(self.clipboard, pos.x, pos.y))
+            self.history.do(f"paste {len(objs)} objects", (), objs)
+        self.selected = objs
+        print(f"Pasted {len(objs)} objects")
+
+    def array_fill(self, pos):
+        # repeats the selection array_count times, each copy is moved from the one before by the distance from
+        # the selection's top left to the mouse
+        alive = self.alive_selection()
+        specs = LevelParser(repr(alive), "editor").parse()
+        origin = EditorLevelManager.origin_of(specs)
+        dx, dy = pos.x - origin.x, pos.y - origin.y
+        if dx == 0 and dy == 0:
+            print("Move the mouse away from the selection to set the distance between the copies")
+            return
+        filled = []
+        for n in range(1, self.array_count + 1):
+            filled += EditorLevelManager.shifted(specs, dx * n, dy * n)
+        with GCPaused():
+            objs = LevelParser.instantiate(filled)
+            self.history.do(f"array fill {len(objs)} objects", (), objs)
+        self.selected = alive + objs
+        print(f"Filled {self.array_count} copies of {len(alive)} objects")
+
+    def move_selection(self, dx, dy):
+        alive = self.alive_selection()
+        moved = EditorLevelManager.moved(alive, dx, dy)
+        self.history.do(f"move {len(alive)} objects", alive, moved)
+        self.selected = moved
+
+    def box_select(self):
+        # with nothing held, dragging the left mouse button selects everything in the box
+        point = get_screen_to_world_2d(get_mouse_position(), get_game().get_cam())
+        if is_mouse_button_pressed(0):
+            self.box_start = point
+        elif is_mouse_button_released(0) and self.box_start is not None:
+            found = get_game().spatial.query(self.box_start.x, self.box_start.y, point.x, point.y)
+            if is_key_down(KeyboardKey(0).KEY_LEFT_SHIFT): # adds to the selection
+                found = list(dict.fromkeys(self.alive_selection() + found))
+            self.selected = found
+            self.box_start = None
+            print(f"Selected {len(self.selected)} objects")
                 
     
     def draw(self):
+        if get_game().overview:
+            half_width = screen_width / 2 / self.zoom
+            x = get_game().get_cam().target.x
+            self.lod.draw(x - half_width, x + half_width, self.zoom)
+
         if self.held_item is not None:
             pos = EditorLevelManager.get_desired_mouse_pos()
             actual = self.held_item.offset(pos)
@@ -2455,6 +4863,17 @@ class EditorLevelManager(GameObj):
             self.held_item.draw_preview(actual)
             get_game().reset_rot()
 
+        if self.box_start is not None:
+            point = get_screen_to_world_2d(get_mouse_position(), get_game().get_cam())
+            x, y = min(point.x, self.box_start.x), min(point.y, self.box_start.y)
+            draw_rectangle_lines(int(x), int(y), int(abs(point.x - self.box_start.x)), int(abs(point.y - self.box_start.y)), BLUE)
+        for i in self.selected:
+            if i not in get_game().spatial.placed: # deleted since it was selected
+                continue
+            p = VecMath.floor_i(i.area.position)
+            d = VecMath.floor_i(i.area.dimension)
+            draw_rectangle_lines(p.x, p.y, d.x, d.y, BLUE)
+
 class EditorLevel(Level):
 
     def __init__(self, level_get=None):
@@ -2477,6 +4896,8 @@ class EditorLevel(Level):
                     return [Ground()] + retrived
                 return EditorLevel.level_data() + retrived
             super().__init__("Editor", get)
+            if isinstance(level_get, Level):
+                self.source = level_get.source
     
     @staticmethod
     def level_data():
@@ -2571,64 +4992,194 @@ class BlankLevel(Level):
     def level_data():
         return [Player(), Ground()]
 
+class StressLevel(Level):
+    """
+    Generated levels of any size for scaling tests (see stress_level.py), the shipped ones are too small to show
+    what's O(n) or worse. Every screen gets the same number of objects: a few obstacles along the ground spaced
+    out so a cube can jump each one (spikes, blocks, pads, orbs over spikes, square & slow speed portals, camera
+    resets), the rest fills rows of a grid high above where the player can reach, in the given mix of kinds.
+    """
+    COUNT = 10_000
+    DENSITY = 250 # objects per screen
+    GRID = 50
+    SCREEN = 1_250 # a whole number of beats, so the grid lines up across screens
+    BEAT = 250 # one obstacle on the ground per beat, a jump at default speed covers 170
+    START_X = 0
+    SCENERY_Y = -300 # bottom of the filler rows, a cube jump peaks around y 125 & pads don't go this high
+    MIX = {"Tile": 40, "Spike": 25, "Slope": 10, "Orb": 8, "Pad": 8, "Portal": 4, "Trigger": 5}
+    ROTATIONS = (0, 90, 180, 270)
+    ORBS = ("JumpOrb", "GravityOrb")
+    PADS = ("JumpPad", "GravityPad")
+    PORTALS = ("ShipPortal", "SquarePortal", "BallPortal", "WavePortal",
+               "DefaultSpeedPortal", "FastSpeedPortal", "VeryFastSpeedPortal", "FastestSpeedPortal")
+    PATH_PORTALS = ("SquarePortal", "DefaultSpeedPortal", "FastSpeedPortal") # faster than this jumps land on the next beat
+
+    def __init__(self, count=COUNT, density=DENSITY, mix=None, seed=0):
+        specs = StressLevel.generate(count, density, mix, seed)
+        super().__init__(f"Stress Level {count}", lambda: LevelParser.instantiate(specs))
+        self.specs = specs
+
+    @staticmethod
+    def objects(count=COUNT, density=DENSITY, mix=None, seed=0):
+        return LevelParser.instantiate(StressLevel.generate(count, density, mix, seed))
+
+    @staticmethod
+    def parse_mix(text):
+        # 'Tile:40,Spike:20' -> {'Tile': 40, 'Spike': 20}
+        mix = {}
+        for part in text.split(","):
+            kind, _, weight = part.partition(":")
+            if kind not in StressLevel.MIX:
+                raise ValueError(f"unknown kind '{kind}', pick from {', '.join(StressLevel.MIX)}")
+            mix[kind] = float(weight or 1)
+        return mix
+
+    @staticmethod
+    def generate(count=COUNT, density=DENSITY, mix=None, seed=0):
+        # specs of a level with 'count' objects besides the player, ground & win wall
+        mix = StressLevel.MIX if mix is None else mix
+        kinds = [k for k, w in mix.items() if w > 0]
+        if not kinds:
+            raise ValueError("the mix needs at least one kind with a weight above 0")
+        weights = list(itert.accumulate(mix[k] for k in kinds))
+        rng = random.Random(seed)
+        pick = lambda: rng.choices(kinds, cum_weights=weights)[0]
+
+        screens = max(1, math.ceil(count / density))
+        columns = StressLevel.SCREEN // StressLevel.GRID
+        specs = [LevelSpec("Player", (V2(StressLevel.START_X - 400.0, 0.0),)), LevelSpec("Ground", ())]
+        for screen in range(screens):
+            budget = (screen + 1) * count // screens - screen * count // screens
+            left = StressLevel.START_X + screen * StressLevel.SCREEN
+
+            for beat in range(0, StressLevel.SCREEN, StressLevel.BEAT):
+                path = StressLevel.path_specs(pick(), left + beat, rng)
+                if len(path) > budget:
+                    break
+                specs.extend(path)
+                budget -= len(path)
+
+            for cell in range(budget):
+                row, column = divmod(cell, columns)
+                x = float(left + column * StressLevel.GRID)
+                y = float(StressLevel.SCENERY_Y - (row + 1) * StressLevel.GRID)
+                specs.append(StressLevel.scenery_spec(pick(), x, y, rng))
+
+        end = StressLevel.START_X + screens * StressLevel.SCREEN
+        specs.append(LevelSpec("WinWall", (V2(end + 500.0, 0.0),)))
+        return specs
+
+    @staticmethod
+    def path_specs(kind, x, rng):
+        # what goes on the ground for one beat, always jumpable from the ground
+        ground = Ground.ALTITUDE
+        mid = x + StressLevel.BEAT / 2
+        if kind == "Spike":
+            return [LevelSpec("Spike", (V2(mid, ground), 0))]
+        if kind == "Orb":
+            return [LevelSpec("Spike", (V2(mid, ground), 0)), LevelSpec("JumpOrb", (V2(mid, ground - 125.0), ))]
+        if kind == "Pad":
+            return [LevelSpec("JumpPad", (V2(mid - Pad.WIDTH / 2, ground - Pad.HEIGHT), ))]
+        if kind == "Portal":
+            portal = rng.choice(StressLevel.PATH_PORTALS)
+            return [LevelSpec(portal, (V2(mid, ground - Portal.HEIGHT), ))]
+        if kind == "Trigger":
+            return [LevelSpec("CameraResetTrigger", (V2(mid, ground - 50.0), ))]
+        # tiles & slopes: a block to hop onto
+        return [LevelSpec("Tile", (V2(mid - 25, ground - 50.0), V2(50.0, 50.0)))]
+
+    @staticmethod
+    def scenery_spec(kind, x, y, rng):
+        # one object filling the grid cell with its top left at x, y
+        if kind == "Tile":
+            return LevelSpec("Tile", (V2(x, y), V2(50.0, 50.0)))
+        if kind == "Spike":
+            return LevelSpec("Spike", (V2(x + 25, y + 50), rng.choice(StressLevel.ROTATIONS)))
+        if kind == "Slope":
+            return LevelSpec("Slope", (V2(x, y), rng.choice(StressLevel.ROTATIONS)))
+        if kind == "Orb":
+            return LevelSpec(rng.choice(StressLevel.ORBS), (V2(x + 25, y + 25), ))
+        if kind == "Pad":
+            return LevelSpec(rng.choice(StressLevel.PADS), (V2(x, y + 50 - Pad.HEIGHT), ))
+        if kind == "Portal":
+            return LevelSpec(rng.choice(StressLevel.PORTALS), (V2(x + 20, y - 50), ))
+        # triggers fire on the player's x alone, so only ones that can't get the camera stuck
+        return LevelSpec("CameraResetTrigger", (V2(x + 25, y + 25), ))
+
 class HardLevel(Level):
+    PATH = "levels/hard.level"
+
     def __init__(self):
-        super().__init__("HardLevel", HardLevel.level_data)
+        super().__init__("HardLevel", HardLevel.level_data, HardLevel.PATH)
     
     @staticmethod
     def level_data():
-        return Level.from_file("levels/hard.level").get()
+        return Level.from_file(HardLevel.PATH).get()
     
 class ShipLevel(Level):
+    PATH = "levels/ship.level"
+
     def __init__(self):
-        super().__init__("ShipLevel", ShipLevel.level_data)
+        super().__init__("ShipLevel", ShipLevel.level_data, ShipLevel.PATH)
     
     @staticmethod
     def level_data():
-        return Level.from_file("levels/ship.level").get()
+        return Level.from_file(ShipLevel.PATH).get()
     
 class BallWaveLevel(Level):
+    PATH = "levels/ballwave.level"
+
     def __init__(self):
-        super().__init__("Ball Wave Level", BallWaveLevel.level_data)
+        super().__init__("Ball Wave Level", BallWaveLevel.level_data, BallWaveLevel.PATH)
     
     @staticmethod
     def level_data():
-        return Level.from_file("levels/ballwave.level").get()
+        return Level.from_file(BallWaveLevel.PATH).get()
 
 class RadioAngerLevel(Level):
+    PATH = "levels/radioanger.level"
+
     def __init__(self):
-        super().__init__("Radio Anger", RadioAngerLevel.level_data)
+        super().__init__("Radio Anger", RadioAngerLevel.level_data, RadioAngerLevel.PATH)
     
     @staticmethod
     def level_data():
-        return Level.from_file("levels/radioanger.level").get()
+        return Level.from_file(RadioAngerLevel.PATH).get()
 
 class ImprovementLevel(Level):
+    PATH = "levels/Improvement.level"
+
     def __init__(self):
-        super().__init__("Improvement", ImprovementLevel.level_data)
+        super().__init__("Improvement", ImprovementLevel.level_data, ImprovementLevel.PATH)
     
     @staticmethod
     def level_data():
-        return Level.from_file("levels/Improvement.level").get()
+        return Level.from_file(ImprovementLevel.PATH).get()
 
 class SlippyLevel(Level):
+    PATH = "levels/Slippy.level"
+
     def __init__(self):
-        super().__init__("Slippy", SlippyLevel.level_data)
+        super().__init__("Slippy", SlippyLevel.level_data, SlippyLevel.PATH)
     
     @staticmethod
     def level_data():
-        return Level.from_file("levels/Slippy.level").get()
+        return Level.from_file(SlippyLevel.PATH).get()
 
 class LudicrousLevel(Level):
+    PATH = "levels/Ludicrous.level"
+
     def __init__(self):
-        super().__init__("Ludicrous", LudicrousLevel.level_data)
+        super().__init__("Ludicrous", LudicrousLevel.level_data, LudicrousLevel.PATH)
     
     @staticmethod
     def level_data():
-        return Level.from_file("levels/Ludicrous.level").get()
+        return Level.from_file(LudicrousLevel.PATH).get()
 
 class UI:
     class Button(GameObj):
+        LAYER = RenderLayer.SCREEN_UI
+
         def __init__(self, pos, dim, callback=lambda: None):
             super().__init__()
             self.position = pos
@@ -2639,15 +5190,15 @@ class UI:
             self.always_think = True
             self.callback = callback
 
-        def is_ui_element(self):
-            return True
 
         def logic(self):
+            if not is_mouse_button_released(0): # cheap check first, the level select can have thousands of buttons
+                return
             if self.is_ui_element():
                 mouse = get_mouse_position()
             else:
                 mouse = get_screen_to_world_2d(get_mouse_position(), get_game().get_cam())
-            if is_mouse_button_released(0) and Rect.check_collision_with_point(self.area, mouse):
+            if Rect.check_collision_with_point(self.area, mouse):
                 self.apply()
                 self.callback()
 
@@ -2660,8 +5211,6 @@ class UI:
             self.color = color
             self.callback = callback
 
-        def is_ui_element(self):
-            return True
 
         def ui_draw(self):
             pos = VecMath.floor_i(self.position)
@@ -2752,6 +5301,8 @@ class UI:
             pass
     
     class TextDisplay(GameObj):
+        LAYER = RenderLayer.SCREEN_UI
+
         def __init__(self, pos, text, font_size, color):
             super().__init__()
             self.position = pos
@@ -2760,8 +5311,6 @@ class UI:
             self.color = color
             self.always_think = True
         
-        def is_ui_element(self):
-            return True
 
         def __len__(self):
             return measure_text(self.text, self.font_size)
@@ -2771,6 +5320,302 @@ class UI:
             draw_text(self.text, pos.x, pos.y, self.font_size, self.color)
                 
 
+LevelInfo = namedtuple("LevelInfo", "path name objects length portals hash mtime size")
+
+class LevelIndex:
+    """
+    What the level select screen needs to know about the level files in a folder, saved in '<folder>/.index.json'
+    so only files that changed since the last time (by mtime & size) have to be opened & parsed again.
+    """
+    FILE = ".index.json"
+    VERSION = 1
+    EXTENSIONS = (".level", BinaryLevel.EXTENSION)
+    PORTALS = ("ShipPortal", "SquarePortal", "BallPortal", "WavePortal", "DefaultSpeedPortal", "FastSpeedPortal", "VeryFastSpeedPortal", "FastestSpeedPortal")
+
+    _folders = {} # folder -> {path: LevelInfo}
+
+    @staticmethod
+    def find_files(folder):
+        files = []
+        if not os.path.isdir(folder):
+            return files
+        for entry in os.scandir(folder):
+            if entry.name.startswith("."): # .thumbnails, the index itself, ...
+                continue
+            if entry.is_dir():
+                files += LevelIndex.find_files(entry.path)
+            elif os.path.splitext(entry.name)[1] in LevelIndex.EXTENSIONS:
+                files.append((entry.path, entry.stat()))
+        return files
+
+    @staticmethod
+    def describe(path, stat):
+        with open(path, "rb") as f:
+            digest = hashlib.sha1(f.read()).hexdigest()
+        name, specs = Level.read_file(path)
+
+        portals = {}
+        length = None
+        for s in specs:
+            if s.type in LevelIndex.PORTALS:
+                portals[s.type] = portals.get(s.type, 0) + 1
+            elif s.type == "WinWall" and type(s.args[0]) is V2:
+                length = s.args[0].x
+        return LevelInfo(path, name.strip(), len(specs), length, portals, digest, stat.st_mtime_ns, stat.st_size)
+
+    @staticmethod
+    def read(folder):
+        try:
+            with open(os.path.join(folder, LevelIndex.FILE), "r") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return {}
+        if data.get("version") != LevelIndex.VERSION:
+            return {}
+        return {i["path"]: LevelInfo(**i) for i in data["levels"]}
+
+    @staticmethod
+    def write(folder, infos):
+        path = os.path.join(folder, LevelIndex.FILE)
+        tmp = path + f".{os.getpid()}.tmp"
+        with open(tmp, "w") as f:
+            json.dump({"version": LevelIndex.VERSION, "levels": [i._asdict() for i in infos.values()]}, f)
+        os.replace(tmp, path)
+
+    @staticmethod
+    def scan(folder):
+        """Every level in the folder sorted by path, only new or changed files get opened."""
+        old = LevelIndex._folders.get(folder)
+        if old is None:
+            old = LevelIndex.read(folder)
+
+        infos = {}
+        changed = False
+        for path, stat in LevelIndex.find_files(folder):
+            info = old.get(path)
+            if info is None or info.mtime != stat.st_mtime_ns or info.size != stat.st_size:
+                try:
+                    info = LevelIndex.describe(path, stat)
+                except (OSError, ValueError) as e:
+                    sys.stderr.write(f"Skipping level '{path}': {e}\n")
+                    continue
+                changed = True
+            infos[path] = info
+        changed = changed or len(infos) != len(old)
+
+        if changed and os.path.isdir(folder):
+            try:
+                LevelIndex.write(folder, infos)
+            except OSError as e:
+                sys.stderr.write(f"Couldn't save the level index for '{folder}': {e}\n")
+        LevelIndex._folders[folder] = infos
+        return [infos[i] for i in sorted(infos)]
+
+    @staticmethod
+    def lookup(path):
+        for infos in LevelIndex._folders.values(): # levels in sub folders are in the index of the folder that was scanned
+            if path in infos:
+                return infos[path]
+        folder = os.path.dirname(path)
+        if folder not in LevelIndex._folders:
+            LevelIndex.scan(folder)
+        return LevelIndex._folders[folder].get(path)
+
+    @staticmethod
+    def summary(info):
+        text = f"{info.objects} objects"
+        if info.length is not None:
+            text += f", {int(info.length)} long"
+        modes = [p[:-len("Portal")].lower() for p in LevelIndex.PORTALS[:4] if p in info.portals]
+        if len(modes) > 0:
+            text += ", " + "/".join(modes)
+        return text
+
+class LevelThumbnails:
+    """
+    Previews for the level select screen. They're rasterized in worker processes with raylib's CPU side
+    Image functions (no OpenGL context needed) & cached as pngs in a '.thumbnails' folder next to the level,
+    named after the level & the hash of its contents so editing a level makes a new one, which replaces the old.
+    """
+    WIDTH = 900
+    HEIGHT = 150
+    MARGIN = 6
+    FOLDER = ".thumbnails"
+    BACKGROUND = (200, 200, 200, 255)
+    SPEED_PORTAL_COLOR = (102, 191, 255, 255)
+
+    _pool = None
+    _requests = {}
+    _textures = {}
+
+    @staticmethod
+    def shown_types():
+        return (Tile, Spike, Slope, Portal, Orb, Pad, WinWall)
+
+    @staticmethod
+    def source_of(level):
+        if level.path is not None:
+            return level.path
+        return type(level).__name__ # code defined levels get rebuilt in the worker
+
+    @staticmethod
+    def request(level):
+        source = LevelThumbnails.source_of(level)
+        if source not in LevelThumbnails._requests:
+            if LevelThumbnails._pool is None:
+                # spawn instead of fork, forking a process that has a window & threads isn't a good idea
+                LevelThumbnails._pool = ProcessPoolExecutor(max_workers=min(4, os.cpu_count() or 1), mp_context=multiprocessing.get_context("spawn"))
+            LevelThumbnails._requests[source] = LevelThumbnails._pool.submit(LevelThumbnails.render, source)
+        return source
+
+    @staticmethod
+    def texture(source):
+        """The preview texture once the worker is done, otherwise None. Never blocks."""
+        if source in LevelThumbnails._textures:
+            return LevelThumbnails._textures[source]
+
+        future = LevelThumbnails._requests.get(source)
+        if future is None or not future.done():
+            return None
+
+        texture = None
+        if future.exception() is not None:
+            sys.stderr.write(f"Failed to make a preview for '{source}': {future.exception()}\n")
+        else:
+            texture = load_texture(future.result())
+        LevelThumbnails._textures[source] = texture
+        return texture
+
+    @staticmethod
+    def shutdown():
+        if LevelThumbnails._pool is not None:
+            LevelThumbnails._pool.shutdown(wait=False, cancel_futures=True)
+            LevelThumbnails._pool = None
+        for texture in LevelThumbnails._textures.values():
+            if texture is not None:
+                unload_texture(texture)
+        LevelThumbnails._textures.clear()
+        LevelThumbnails._requests.clear()
+
+    @staticmethod
+    def render(source): # runs in a worker process
+        if os.path.isfile(source):
+            with open(source, "rb") as f:
+                digest = hashlib.sha1(f.read()).hexdigest()
+            folder = os.path.join(os.path.dirname(source), LevelThumbnails.FOLDER)
+            key = os.path.basename(source)
+            objs = None
+        else:
+            objs = globals()[source]().get()
+            digest = hashlib.sha1(repr(objs).encode()).hexdigest()
+            folder = os.path.join("levels", LevelThumbnails.FOLDER)
+            key = source
+
+        path = os.path.join(folder, f"{key}-{digest[:16]}.png")
+        if os.path.exists(path):
+            return path
+
+        if objs is None:
+            objs = Level.from_file(source).get()
+
+        os.makedirs(folder, exist_ok=True)
+        image = LevelThumbnails.rasterize(objs)
+        tmp = path + f".{os.getpid()}.png"
+        export_image(image, tmp)
+        unload_image(image)
+        os.replace(tmp, path)
+        LevelThumbnails.remove_old(folder, key, path)
+        return path
+
+    @staticmethod
+    def remove_old(folder, key, current):
+        # the previews of older versions of the level, nothing else would ever delete them. Ones named
+        # only after the hash are from before previews had the level's name & can't be told apart, they all go
+        old = re.compile(re.escape(key) + r"-[0-9a-f]{16}\.png|[0-9a-f]{16}\.png")
+        for name in os.listdir(folder):
+            path = os.path.join(folder, name)
+            if old.fullmatch(name) and path != current:
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass # another worker got to it first
+
+    @staticmethod
+    def _points(cmd):
+        """Corners of a draw command in world space, with its rotation applied."""
+        if cmd.shape == Draw.RECT:
+            w, h = cmd.args
+            points = [(cmd.x, cmd.y), (cmd.x + w, cmd.y), (cmd.x + w, cmd.y + h), (cmd.x, cmd.y + h)]
+        elif cmd.shape in (Draw.TRIANGLE, Draw.TRIANGLE_STRIP):
+            points = list(cmd.args[:3])
+        elif cmd.shape == Draw.CIRCLE:
+            r = cmd.args[0]
+            points = [(cmd.x - r, cmd.y - r), (cmd.x + r, cmd.y + r)]
+        elif cmd.shape == Draw.TEXTURE: # speed portals, drawn as a plain square
+            points = [(cmd.x, cmd.y), (cmd.x + 50, cmd.y), (cmd.x + 50, cmd.y + 50), (cmd.x, cmd.y + 50)]
+        else:
+            points = [(cmd.x, cmd.y)]
+
+        if cmd.origin is not None and cmd.rotation != 0:
+            # same as rl_rotatef(rotation, 0, 0, -1) around the origin
+            a = math.radians(-cmd.rotation)
+            ox, oy = cmd.origin
+            points = [
+                (ox + (x-ox)*math.cos(a) - (y-oy)*math.sin(a), oy + (x-ox)*math.sin(a) + (y-oy)*math.cos(a))
+                for x, y in points
+            ]
+        return points
+
+    @staticmethod
+    def rasterize(objs):
+        shapes = []
+        bounded = [(0, Ground.ALTITUDE)]
+        for obj in objs:
+            if not isinstance(obj, LevelThumbnails.shown_types()): continue
+
+            cmds = []
+            obj.draw_cmds(cmds)
+            for cmd in cmds:
+                points = LevelThumbnails._points(cmd)
+                shapes.append((cmd, points))
+                if isinstance(obj, WinWall): # it's 20k units tall, only its start matters
+                    bounded.append((obj.position.x + 50, Ground.ALTITUDE))
+                else:
+                    bounded += points
+
+        min_x = min(p[0] for p in bounded)
+        max_x = max(p[0] for p in bounded)
+        min_y = min(p[1] for p in bounded)
+        max_y = Ground.ALTITUDE + 20
+
+        inner_w = LevelThumbnails.WIDTH - LevelThumbnails.MARGIN*2
+        inner_h = LevelThumbnails.HEIGHT - LevelThumbnails.MARGIN*2
+        scale = min(inner_w / max(max_x - min_x, 1), inner_h / max(max_y - min_y, 1))
+        left = LevelThumbnails.MARGIN
+        top = LevelThumbnails.HEIGHT - LevelThumbnails.MARGIN - (max_y - min_y) * scale
+
+        def px(p):
+            return (left + (p[0] - min_x) * scale, top + (p[1] - min_y) * scale)
+
+        image = gen_image_color(LevelThumbnails.WIDTH, LevelThumbnails.HEIGHT, LevelThumbnails.BACKGROUND)
+        ground_y = int(px((0, Ground.ALTITUDE))[1])
+        image_draw_rectangle(image, 0, ground_y, LevelThumbnails.WIDTH, LevelThumbnails.HEIGHT - ground_y, GRAY)
+
+        for cmd, points in shapes:
+            points = [px(p) for p in points]
+            color = LevelThumbnails.SPEED_PORTAL_COLOR if cmd.shape == Draw.TEXTURE else cmd.color
+
+            if len(points) == 3:
+                image_draw_triangle(image, points[0], points[1], points[2], color)
+            elif cmd.shape == Draw.CIRCLE:
+                (x1, y1), (x2, y2) = points
+                image_draw_circle(image, int((x1 + x2)/2), int((y1 + y2)/2), max(1, int((x2 - x1)/2)), color)
+            else:
+                x1, y1 = min(p[0] for p in points), min(p[1] for p in points)
+                x2, y2 = max(p[0] for p in points), max(p[1] for p in points)
+                image_draw_rectangle(image, int(x1), int(y1), max(1, int(x2 - x1)), max(1, int(y2 - y1)), color)
+        return image
+
 class LevelSelectScreen(Level):
     LEVELS = [
         SlippyLevel(),
@@ -2803,6 +5648,7 @@ class LevelSelectScreen(Level):
             return "cam_holder"
 
         def _move_input(self, lvls):
+            LevelPrefetcher.around(lvls, self.index)
             if self.index < len(lvls)-1 and Input.right_pressed():
                 self.moving_to = get_game().get_cam().target.x + 1_500
                 self.index += 1
@@ -2829,6 +5675,7 @@ class LevelSelectScreen(Level):
                     cam.target.x += 100
 
     class EditorCheckBox(UI.Button):
+        LAYER = RenderLayer.WORLD
         WIDTH = 100
         HEIGHT = 100
         CIRCLE_RAD = 35
@@ -2852,8 +5699,6 @@ class LevelSelectScreen(Level):
         def apply(self):
             self.checked = not self.checked
 
-        def is_ui_element(self):
-            return False
 
         def draw(self):
             pos = VecMath.floor_i(self.position)
@@ -2865,6 +5710,7 @@ class LevelSelectScreen(Level):
             draw_text("Open in Editor", pos.x+110, pos.y+35, 34, BLACK)
 
     class LevelButton(UI.Button):
+        LAYER = RenderLayer.WORLD
         WIDTH = 1_000
         HEIGHT = 500
 
@@ -2872,24 +5718,40 @@ class LevelSelectScreen(Level):
             super().__init__(pos, Vector2(LevelSelectScreen.LevelButton.WIDTH, LevelSelectScreen.LevelButton.HEIGHT))
             self.level = lvl
             self.color = color
+            self.thumbnail = None # requested the first time the button is drawn, there can be thousands of custom levels
+            self.info = None if lvl.path is None else LevelIndex.lookup(lvl.path)
         
         def apply(self):
             desired_level = self.level
             if get_game().find_by_tag("editor_check").is_toggled():
                 desired_level = EditorLevel(self.level)
+            get_game().start_level_switch(desired_level, self.level.is_prepared())
             get_game().get_cam().target = Vector2(0, 0)
             get_game().defer(lambda: get_game().set_level(desired_level))
 
-        def is_ui_element(self):
-            return False
+
+        def on_screen(self):
+            cam_x = get_game().get_cam().target.x
+            return self.position.x + LevelSelectScreen.LevelButton.WIDTH >= cam_x - screen_width/2 and self.position.x <= cam_x + screen_width/2
 
         def draw(self):
+            if not self.on_screen(): # buttons always think, so this is what keeps thousands of custom levels cheap
+                return
             pos = VecMath.floor_i(self.position)
             draw_rectangle_rounded(Rectangle(pos.x, pos.y, LevelSelectScreen.LevelButton.WIDTH, LevelSelectScreen.LevelButton.HEIGHT), 0.5, 50, self.color)
 
             draw_text(self.level.name, pos.x+500-(measure_text(self.level.name, 54)//2), pos.y+200, 54, WHITE)
+            if self.info is not None:
+                summary = LevelIndex.summary(self.info)
+                draw_text(summary, pos.x+500-(measure_text(summary, 30)//2), pos.y+120, 30, WHITE)
+
+            if self.thumbnail is None:
+                self.thumbnail = LevelThumbnails.request(self.level)
+            if (preview := LevelThumbnails.texture(self.thumbnail)) is not None:
+                draw_texture(preview, pos.x + (LevelSelectScreen.LevelButton.WIDTH - preview.width)//2, pos.y+290, WHITE)
 
     class CustomLevels(UI.Button):
+        LAYER = RenderLayer.WORLD
         WIDTH = 200
         HEIGHT = 100
 
@@ -2906,24 +5768,14 @@ class LevelSelectScreen(Level):
         def get_tag(self):
             return "customlevels_button"
 
-        def find_custom_level_files(self):
-            total_files = []
-            for root, dirs, files in os.walk("./custom_levels"):
-                for file in files:
-                    if os.path.splitext(file)[1] == ".level": # splittext()[1] is the file extension
-                        path = os.path.join(root, file)
-                        total_files.append(path)
-            
-            return total_files
-
         def load_custom_level_buttons(self):
             self.levels.clear()
-            files = self.find_custom_level_files()
-            print("loading", files)
+            infos = LevelIndex.scan("./custom_levels")
+            print(f"loading {len(infos)} custom levels")
 
             x = -500
-            for i in files:
-                level = Level.from_file(i)
+            for i in infos:
+                level = Level.from_file(i.path, i.name)
                 self.levels.append(level)
 
                 button = LevelSelectScreen.LevelButton(Vector2(x, 700), level, RED)
@@ -2955,8 +5807,6 @@ class LevelSelectScreen(Level):
             self.position = VecMath.add(get_game().get_cam().target, Vector2(400, 210))
             self.area.position = clone_vec(self.position)
 
-        def is_ui_element(self):
-            return False
 
         def draw(self):
             pos = VecMath.floor_i(self.position)
@@ -3017,6 +5867,12 @@ class BackgroundLoader:
         BackgroundLoader.CACHED[background.sprite_path] = sprite
         return sprite
     
+    @staticmethod
+    def get_path_sprite(sprite_path): # for draw lists, which only know the path
+        if sprite_path not in BackgroundLoader.CACHED:
+            BackgroundLoader.get_sprite_cache(Background(sprite_path))
+        return BackgroundLoader.CACHED[sprite_path]
+    
     @staticmethod
     def clear_cache():
         for k,v in BackgroundLoader.CACHED.items():
@@ -3025,6 +5881,8 @@ class BackgroundLoader:
         BackgroundLoader.CACHED.clear()
 
 class Background(GameObj):
+    LAYER = RenderLayer.BACKGROUND
+
     def __repr__(self):
         return f"Background('{self.sprite_path}', {self.centerx}, {self.tint}, Vector2({self.stretch.x}, {self.stretch.y}), {self.parallax_speed}, {self.fade})"
 
@@ -3049,8 +5907,10 @@ class Background(GameObj):
     
     def get_sprite(self):
         if self.sprite is None:
-            with RaylibImage(self.sprite_path) as image:
-                image_resize_nn(image, int(image.width * self.stretch.x), int(image.height * self.stretch.y))
+            stretched = (self.stretch.x, self.stretch.y) != (1, 1)
+            with RaylibImage(self.sprite_path, writable=stretched) as image:
+                if stretched:
+                    image_resize_nn(image, int(image.width * self.stretch.x), int(image.height * self.stretch.y))
                 self.sprite = load_texture_from_image(image)
 
         return self.sprite
@@ -3086,12 +5946,457 @@ class Background(GameObj):
         draw_texture_ex(sprite, Vector2(offset.x + (sprite.width*2), offset.y), 0, 1, tint)
         draw_texture_ex(sprite, Vector2(offset.x + (sprite.width*3), offset.y), 0, 1, tint)
 
+    def draw_cmds(self, out):
+        cam = get_game().get_cam()
+        x = cam.target.x - cam.offset.x - (cam.target.x + self.centerx) * self.parallax_speed
+        y = cam.target.y - cam.offset.y
+
+        tint = self.tint
+        if self.fade:
+            tint = Color(*self.tint[:3], min(int((get_time() - self.start_time) * 200), 255))
+
+        out.append(Draw.cmd(Draw.BACKGROUND, x, y, tint, self.sprite_path))
+
+
+# the camera is only passed through here, the main thread never touches the game's while the simulation runs
+FrameSnapshot = namedtuple("FrameSnapshot", "cmds cam_target cam_offset cam_zoom progress input_time phases visible drawn level level_ticks")
+
+class FrameBuffer:
+    """
+    Double buffer between the simulation thread, which writes a FrameSnapshot every tick, and the main thread,
+    which only ever draws the latest complete one.
+    """
+    def __init__(self):
+        self._slots = [None, None]
+        self._front = 0
+        self._lock = threading.Lock()
+        self.published = 0
+
+    def publish(self, snapshot):
+        back = 1 - self._front
+        self._slots[back] = snapshot
+        with self._lock:
+            self._front = back
+            self.published += 1
+
+    def latest(self):
+        with self._lock:
+            return self._slots[self._front], self.published
+
+class FrameStats:
+    """
+    Frame pacing & input-to-photon latency, printed when the game closes so runs with and without
+    --threaded can be compared. Latency is measured from the input poll that saw a jump/reset/escape edge
+    to the end_drawing() that presented a frame containing its result.
+    """
+    HISTORY = 60 * 60 * 10
+
+    def __init__(self, name):
+        self.name = name
+        self.intervals = deque(maxlen=FrameStats.HISTORY)
+        self.latencies = deque(maxlen=FrameStats.HISTORY)
+        self._last = None
+
+    def tick(self):
+        now = time.perf_counter()
+        if self._last is not None:
+            self.intervals.append(now - self._last)
+        self._last = now
+
+    def latency(self, since):
+        self.latencies.append(time.perf_counter() - since)
+
+    def summary(self):
+        if len(self.intervals) < 2:
+            return f"{self.name}: not enough frames"
+
+        text = f"{self.name}: {len(self.intervals)} frames, {statistics.mean(self.intervals)*1000:.2f} ms avg, jitter (stdev) {statistics.stdev(self.intervals)*1000:.2f} ms"
+        if len(self.latencies) > 0:
+            lat = sorted(self.latencies)
+            text += f", input to photon {statistics.mean(lat)*1000:.2f} ms avg / {lat[int(len(lat) * 0.95)]*1000:.2f} ms p95 ({len(lat)} inputs)"
+        return text
+
+class PhaseTimer:
+    def __init__(self):
+        self.phases = {}
+        self._last = time.perf_counter()
+
+    def mark(self, phase): # time since the previous mark goes to 'phase'
+        now = time.perf_counter()
+        self.phases[phase] = self.phases.get(phase, 0) + (now - self._last)
+        self._last = now
+
+class PerfOverlay:
+    """
+    Frame time graph with percentiles & a per phase breakdown, toggled with F3 in any level.
+    Meant for catching hitches (like a BackgroundChangeTrigger loading its texture) while playing.
+    """
+    KEY = KeyboardKey(0).KEY_F3
+    HISTORY = 240
+    PHASES = ("visibility", "logic", "draw list", "world draw", "deferred", "ui", "end_drawing")
+    GRAPH_HEIGHT = 100
+    MS_TO_PX = 3
+    
+    def __init__(self):
+        self.shown = False
+        self.frame_times = deque(maxlen=PerfOverlay.HISTORY)
+        self.phase_history = deque(maxlen=PerfOverlay.HISTORY)
+        self.visible_objects = 0
+        self.objects_drawn = 0 # world objects, the same with & without --threaded
+
+        self._timer = None
+        self._start = 0
+
+    def begin(self):
+        if is_key_pressed(PerfOverlay.KEY):
+            self.shown = not self.shown
+        self._start = time.perf_counter()
+        self._timer = PhaseTimer()
+
+    def mark(self, phase):
+        self._timer.mark(phase)
+
+    def end(self, visible_objects, objects_drawn, extra_phases=None):
+        phases = self._timer.phases
+        if extra_phases is not None: # phases measured on the simulation thread
+            phases.update(extra_phases)
+
+        self.frame_times.append(time.perf_counter() - self._start)
+        self.phase_history.append(phases)
+        self.visible_objects = visible_objects
+        self.objects_drawn = objects_drawn
+
+    def percentile(self, q):
+        times = sorted(self.frame_times)
+        return times[min(int(len(times) * q), len(times)-1)]
+
+    def draw(self):
+        if not self.shown or len(self.frame_times) == 0: return
+
+        x = 10
+        y = get_screen_height() - PerfOverlay.GRAPH_HEIGHT - 250
+        draw_rectangle(x - 5, y - 5, PerfOverlay.HISTORY * 2 + 10, PerfOverlay.GRAPH_HEIGHT + 250, Color(0, 0, 0, 180))
+
+        bottom = y + PerfOverlay.GRAPH_HEIGHT
+        for i, t in enumerate(self.frame_times):
+            ms = t * 1000
+            color = GREEN if ms <= 17.5 else (YELLOW if ms <= 34 else RED)
+            h = min(int(ms * PerfOverlay.MS_TO_PX), PerfOverlay.GRAPH_HEIGHT)
+            draw_rectangle(x + i*2, bottom - h, 2, h, color)
+        target = bottom - int(1000 / 60 * PerfOverlay.MS_TO_PX)
+        draw_line(x, target, x + PerfOverlay.HISTORY * 2, target, WHITE)
+
+        y = bottom + 10
+        draw_text(f"p50 {self.percentile(0.5)*1000:.1f} ms  p95 {self.percentile(0.95)*1000:.1f} ms  p99 {self.percentile(0.99)*1000:.1f} ms", x, y, 16, WHITE)
+        y += 22
+        draw_text(f"visible objects {self.visible_objects}  objects drawn {self.objects_drawn}", x, y, 16, WHITE)
+        y += 26
+
+        draw_text("phase            avg ms   max ms", x, y, 16, LIGHTGRAY)
+        for phase in PerfOverlay.PHASES:
+            times = [p.get(phase, 0) for p in self.phase_history]
+            if max(times) == 0: continue
+            y += 20
+            draw_text(phase, x, y, 16, WHITE)
+            draw_text(f"{statistics.mean(times)*1000:.2f}", x + 150, y, 16, WHITE)
+            draw_text(f"{max(times)*1000:.2f}", x + 230, y, 16, WHITE)
+
+        if AllocStats.ENABLED and AllocStats.last is not None:
+            y += 26
+            draw_text(f"allocations {AllocStats.last.vector2} Vector2  {AllocStats.last.vec2i} Vec2i", x, y, 16, WHITE)
+
+AllocFrame = namedtuple("AllocFrame", "frame level vector2 vec2i sites")
+AllocLevel = namedtuple("AllocLevel", "frame level objects alive traced growth")
+
+class AllocStats:
+    """
+    Opt-in (--alloc-stats) measuring of the short lived vectors the hot paths make & of what stays alive
+    between levels. When installed Vector2(), new_vec() & Vec2i are counted, along with the calls to VecMath,
+    clone_vec() & Rect.vertices() that make most of them, and every frame's counts go into a ring buffer.
+    Every set_level() adds how many game objects of each class are still alive (in the game or not, after a
+    collection) and what grew the most since the last tracemalloc snapshot, so churn & leaks show up per level.
+    A summary per level is printed when the game closes. Counting makes every vector cost more, don't profile with it.
+    """
+    ENABLED = "--alloc-stats" in sys.argv
+    HISTORY = 3600 # entries, a minute of frames
+    TOP = 5
+
+    log = deque(maxlen=HISTORY) # AllocFrame & AllocLevel entries, oldest first
+    last = None # the last AllocFrame
+    _counters = [] # a Counter per thread of everything it counted so far, by type & by call site
+    _local = threading.local()
+    _lock = threading.Lock()
+    levels = {} # level name -> Counter of everything counted while it ran & its frame count
+    frame = 0
+    _before = {}
+    _snapshot = None
+    _own = None # lines of this class in the file
+
+    @staticmethod
+    def install():
+        if getattr(Vec2i.__init__, "counted", False):
+            return
+        AllocStats.ENABLED = True
+        local = AllocStats._local
+
+        def counting(name, func):
+            def wrapper(*args, **kwargs):
+                # += on a shared Counter isn't atomic, every thread counts into its own
+                try:
+                    local.counts[name] += 1
+                except AttributeError:
+                    AllocStats.thread_counter()[name] += 1
+                return func(*args, **kwargs)
+            wrapper.counted = True
+            return wrapper
+
+        # everything in this module looks these up as globals on every call, so swapping them counts every use
+        module = globals()
+        module["Vector2"] = counting("Vector2", Vector2)
+        module["new_vec"] = counting("Vector2", new_vec)
+        module["clone_vec"] = counting("clone_vec", clone_vec)
+        Vec2i.__init__ = counting("Vec2i", Vec2i.__init__)
+        Rect.vertices = counting("Rect.vertices", Rect.vertices)
+        for name, func in list(vars(VecMath).items()):
+            if isinstance(func, staticmethod):
+                setattr(VecMath, name, staticmethod(counting(f"VecMath.{name}", func.__func__)))
+
+        lines, first = inspect.getsourcelines(AllocStats) # before tracing, the source is cached from then on
+        AllocStats._own = (first, first + len(lines))
+        tracemalloc.start()
+
+    @staticmethod
+    def thread_counter():
+        counts = AllocStats._local.counts = Counter()
+        with AllocStats._lock:
+            AllocStats._counters.append(counts)
+        return counts
+
+    @staticmethod
+    def end_frame(level):
+        # only the thread that owns a counter changes it, so they're never cleared from here, a frame is the
+        # difference of their sum to the last one
+        now = Counter()
+        with AllocStats._lock:
+            counters = list(AllocStats._counters)
+        for counts in counters:
+            now.update(dict(counts)) # copying a dict happens all at once, another thread can't change it halfway
+        before = AllocStats._before
+        frame = {k: n - before.get(k, 0) for k, n in now.items() if n != before.get(k, 0)}
+        AllocStats._before = now
+
+        level = None if level is None else level.name
+        entry = AllocFrame(AllocStats.frame, level, frame.get("Vector2", 0), frame.get("Vec2i", 0), frame)
+        AllocStats.log.append(entry)
+        AllocStats.last = entry
+
+        totals = AllocStats.levels.setdefault(level, Counter())
+        totals.update(frame)
+        totals["frames"] += 1
+        AllocStats.frame += 1
+
+    @staticmethod
+    def level_loaded(game, lvl):
+        gc.collect() # only what's really still referenced counts as alive
+        in_game = Counter(type(o).__name__ for o in game.game_objects)
+        alive = Counter(type(o).__name__ for o in gc.get_objects() if isinstance(o, GameObj))
+
+        snapshot = tracemalloc.take_snapshot().filter_traces((tracemalloc.Filter(False, tracemalloc.__file__), ))
+        growth = []
+        if AllocStats._snapshot is not None:
+            first, last = AllocStats._own
+            for stat in snapshot.compare_to(AllocStats._snapshot, "lineno"):
+                where = stat.traceback[0]
+                # the log itself grows until it's full, that's not the level's doing
+                if where.filename == "<string>" or (where.filename == __file__ and first <= where.lineno < last):
+                    continue
+                growth.append((str(stat.traceback), stat.size_diff))
+                if len(growth) == AllocStats.TOP:
+                    break
+        AllocStats._snapshot = snapshot
+        traced = tracemalloc.get_traced_memory()[0]
+
+        AllocStats.log.append(AllocLevel(AllocStats.frame, lvl.name, in_game, alive, traced, growth))
+        outside = alive - in_game
+        print(
+            f"alloc stats: '{lvl.name.strip()}' {sum(in_game.values())} objects in the game, {sum(outside.values())} more alive"
+            + (f" ({', '.join(f'{n} {c}' for c, n in outside.most_common(AllocStats.TOP))})" if outside else "")
+            + f", {traced / 1024:.0f} KiB traced"
+        )
+        for where, diff in growth:
+            print(f"    {diff / 1024:+.1f} KiB {where}")
+
+    @staticmethod
+    def summary():
+        lines = ["alloc stats per frame:"]
+        for level, totals in AllocStats.levels.items():
+            frames = totals["frames"]
+            sites = [(n, s) for s, n in totals.items() if s not in ("frames", "Vector2", "Vec2i")]
+            sites.sort(reverse=True)
+            lines.append(
+                f"  {str(level).strip()}: {frames} frames, {totals['Vector2'] / frames:.0f} Vector2 & {totals['Vec2i'] / frames:.0f} Vec2i, "
+                + ", ".join(f"{s} {n / frames:.0f}" for n, s in sites[:AllocStats.TOP])
+            )
+        return "\n".join(lines)
+
+class SimulationThread(threading.Thread):
+    """
+    Steps the game at a fixed rate, independent of how long drawing takes, and publishes an immutable
+    FrameSnapshot after every tick. It stops by itself once the level can't be simulated (menus, editor),
+    main() then carries on single threaded. Until then only this thread touches the game, level switches
+    included, the window's size comes in with the input (push_input()) & the camera goes out in the snapshot.
+    """
+    RATE = 60
+
+    def __init__(self, game):
+        super().__init__(name="simulation", daemon=True)
+        self.game = game
+        self.frames = FrameBuffer()
+        self.stats = FrameStats("simulation")
+        self.running = True
+        self.error = None
+
+        self._input_lock = threading.Lock()
+        self._pending = None
+        self._held = InputFrame(False, False, False, False, False, False, 0)
+        self._view = None # (zoom, offset) that fit the window
+
+    def push_input(self, frame, view=None):
+        with self._input_lock:
+            self._pending = frame if self._pending is None else self._pending.merge(frame)
+            if view is not None:
+                self._view = view
+
+    def _take_input(self):
+        with self._input_lock:
+            frame, self._pending = self._pending, None
+            view = self._view
+        if frame is None: # the main thread hasn't polled since the last tick, keep holding whatever was held
+            return self._held, view
+        self._held = frame.held()
+        return frame, view
+
+    def stop(self):
+        self.running = False
+
+    def tick(self, frame, view=None):
+        game = self.game
+        Input._thread.frame = frame
+        timer = PhaseTimer()
+        if view is not None:
+            game.camera.zoom = view[0] * game.zoom
+            game.camera.offset = Vector2(*view[1])
+
+        visible = game.build_visible()
+        timer.mark("visibility")
+        game.run_logic(visible)
+        game.update_cam()
+        timer.mark("logic")
+
+        cmds = []
+        if game.background is not None:
+            game.background.draw_cmds(cmds)
+        drawn = 0
+        for i in game.visible_in_layers(RenderLayer.WORLD, RenderLayer.EDITOR_OVERLAY):
+            i.draw_cmds(cmds)
+            drawn += 1
+
+        cam = game.get_cam()
+        target, offset, zoom = (cam.target.x, cam.target.y), (cam.offset.x, cam.offset.y), cam.zoom
+        progress = game.level_progress()
+        timer.mark("draw list")
+
+        game._call_deferred()
+        timer.mark("deferred")
+
+        self.frames.publish(FrameSnapshot(
+            tuple(cmds), target, offset, zoom, progress,
+            frame.time if frame.has_edge() else None, timer.phases, len(visible), drawn, game.level, game.frame - game.level_frame
+        ))
+
+    def run(self):
+        step = 1 / SimulationThread.RATE
+        next_tick = time.perf_counter()
+        try:
+            while self.running and self.game.can_simulate():
+                self.tick(*self._take_input())
+                self.stats.tick()
+
+                next_tick += step
+                delay = next_tick - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+                else:
+                    next_tick = time.perf_counter() # running behind, don't try to catch up
+        except Exception as e:
+            self.error = e
+        finally:
+            Input._thread.frame = None
+
+class WorldRenderTarget:
+    """
+    The world gets drawn into this at a lower internal resolution & then stretched over the window in one blit,
+    so a fullscreen 4K window costs about as much as the normal one. UI is still drawn at the window resolution.
+    The setting is either a scale of the window ('0.5') or a resolution the image has to fit in ('1280x720').
+    """
+    CLEAR_COLOR = Color(200, 200, 200)
+
+    def __init__(self, setting):
+        self.max_size, self.scale = setting # from render_resolution()
+
+        self.target = None
+        self.width = 0
+        self.height = 0
+
+    def current_scale(self):
+        if self.scale is not None:
+            return self.scale
+        # never go above the window resolution, that would only cost more
+        return min(1, self.max_size[0] / get_screen_width(), self.max_size[1] / get_screen_height())
+
+    def begin(self, cam):
+        scale = self.current_scale()
+        w = max(1, int(get_screen_width() * scale))
+        h = max(1, int(get_screen_height() * scale))
+        if self.target is None or (w, h) != (self.width, self.height):
+            self.unload()
+            self.target = load_render_texture(w, h)
+            set_texture_filter(self.target.texture, TextureFilter.TEXTURE_FILTER_BILINEAR)
+            self.width, self.height = w, h
+
+        begin_texture_mode(self.target)
+        clear_background(WorldRenderTarget.CLEAR_COLOR)
+        return Camera2D(Vector2(w/2, h/2), cam.target, 0, cam.zoom * scale)
+
+    def end(self):
+        end_texture_mode()
+        # render textures are upside down in OpenGL, hence the negative height
+        draw_texture_pro(
+            self.target.texture,
+            Rectangle(0, 0, self.width, -self.height),
+            Rectangle(0, 0, get_screen_width(), get_screen_height()),
+            Vector2(0, 0), 0, WHITE
+        )
+
+    def unload(self):
+        if self.target is not None:
+            unload_render_texture(self.target)
+            self.target = None
+
+def draw_progress_bar(percent):
+    text = f"{round(percent, 1)}%"
+    draw_rectangle(get_screen_width()//2 - 170, 10, int(percent)*3, 20, BLUE)
+    draw_rectangle_lines(get_screen_width()//2 - 170, 10, 300, 20, DARKBLUE)
+
+    draw_text(text, get_screen_width()//2 + 150, 10, 24, BLACK)
 
 win_inited = False
 def main():
     global game
     global win_inited
 
+    if AllocStats.ENABLED:
+        AllocStats.install()
     game = Game()
     set_config_flags(ConfigFlags.FLAG_WINDOW_RESIZABLE)
     
@@ -3101,8 +6406,8 @@ def main():
     set_exit_key(-1)
 
 
-    logo = load_image("textures/Geometry_Splash_Logo.png")
-    set_window_icon(logo)
+    with RaylibImage(LOGO_PATH) as logo:
+        set_window_icon(logo)
     
     cam = Camera2D(Vector2(screen_mid[0], screen_mid[1]), Vector2(0, 0), 0, 1)
     game.camera = cam
@@ -3113,6 +6418,13 @@ def main():
 
     fullscreened = False
 
+    frame_stats = FrameStats("threaded" if THREADED_SIMULATION else "single thread")
+    overlay = PerfOverlay()
+    world_target = WorldRenderTarget(RENDER_RESOLUTION) if RENDER_RESOLUTION is not None else None
+    sim = None
+    presented = 0
+    first_frame = True
+
     last_frame = get_time()
     delta = 1 / 60
     while not window_should_close() and not game.should_end:
@@ -3127,122 +6439,146 @@ def main():
                 set_window_state(ConfigFlags.FLAG_WINDOW_UNDECORATED)
             fullscreened = not fullscreened
 
-
-        visible_threshold = 500
-        visible = []
-        for i in game.game_objects:
-            if i.always_think:
-                if isinstance(i, Background):
-                    game.background = i
-                else:
-                    visible.append(i)
-                continue
-            if i.position.x + visible_threshold >= cam.target.x - (screen_width/2):
-                if cam.target.x + (screen_width/2) >= i.position.x - visible_threshold:
-                    visible.append(i)
+        frame = InputFrame.sample()
+        overlay.begin()
+
+        if sim is None and THREADED_SIMULATION and game.can_simulate():
+            sim = SimulationThread(game)
+            sim.start()
+
+        if sim is not None:
+            # the simulation thread owns the game now, only draw what it hands over
+            sim.push_input(frame, (get_screen_width() / screen_width, (get_screen_width()//2, get_screen_height()//2)))
+            snapshot, published = sim.frames.latest()
+
+            begin_drawing()
+            clear_background(Color(200, 200, 200))
+            if snapshot is not None:
+                view = Camera2D(snapshot.cam_offset, snapshot.cam_target, 0, snapshot.cam_zoom)
+                if world_target is not None:
+                    view = world_target.begin(view)
+                begin_mode_2d(view)
+                Draw.render(snapshot.cmds)
+                end_mode_2d()
+                if world_target is not None:
+                    world_target.end()
+                overlay.mark("world draw")
+
+                if snapshot.progress is not None:
+                    draw_progress_bar(snapshot.progress)
+            overlay.draw()
+            overlay.mark("ui")
+            end_drawing()
+            overlay.mark("end_drawing")
+
+            if snapshot is not None:
+                overlay.end(snapshot.visible, snapshot.drawn, snapshot.phases)
+                game.frame_presented(snapshot.level, snapshot.level_ticks)
+
+            frame_stats.tick()
+            if AllocStats.ENABLED:
+                AllocStats.end_frame(None if snapshot is None else snapshot.level)
+            if published != presented:
+                presented = published
+                if snapshot.input_time is not None:
+                    frame_stats.latency(snapshot.input_time)
+
+            if not sim.is_alive():
+                sim.join()
+                if sim.error is not None:
+                    raise sim.error
+                print(sim.stats.summary())
+                sim = None
+            continue
+
+        visible = game.build_visible()
+        overlay.mark("visibility")
         
         # Logic
-        if game.background is not None:
-            game.background.logic()
-            
-        for i in visible:
-            i.logic()
+        game.run_logic(visible)
+        overlay.mark("logic")
         
         desired_zoom = get_screen_width() / screen_width
 
-        game.camera.zoom = desired_zoom
+        game.camera.zoom = desired_zoom * game.zoom
         game.camera.offset = Vector2(get_screen_width()//2, get_screen_height()//2)
 
         # Drawing
         begin_drawing()
         clear_background(Color(200, 200, 200))
         
-        begin_mode_2d(cam)
+        if world_target is not None:
+            begin_mode_2d(world_target.begin(cam))
+        else:
+            begin_mode_2d(cam)
         if game.background is not None:
             game.background.predraw()
             game.background.draw()
             game.background.postdraw()
         
-        player = game.get_player()
-
-        if (freeze_loc := get_game().frozen_cam) is not None:
-            cam.target = VecMath.lerp(clone_vec(cam.target), clone_vec(freeze_loc), 0.3)
-
-        desired_cam_y_locked = False
-        if (freeze_y := get_game().frozen_y_cam) is not None:
-            desired_cam_y = lerp(cam.target.y, freeze_y, 0.3)
-            desired_cam_y_locked = True
-
-        if freeze_loc is None and player is not None:
-            if not desired_cam_y_locked:
-                desired_cam_y = lerp(cam.target.y, 0, 0.15)
-
-                if not player.halted and player.position.y < -200:
-                    desired_cam_y = lerp(cam.target.y, player.position.y+200, 0.15)
-
-            desired_cam_x = lerp(cam.target.x, player.position.x+200, 0.15)
-
-            if player.halted:
-                desired_cam_x = lerp(cam.target.x, get_game().find_by_tag("Win").position.x - 400, 0.3)
-            cam.target = Vector2(desired_cam_x, desired_cam_y)
-
-        uis = set()
-        ground = None
-        lvlman = None
-        for i in visible:
-            if i.get_tag() == "Ground": # yeah yeah i know i'm being inconsistant
-                ground = i
-                continue
-            if type(i) == EditorLevelManager:
-                lvlman = i
-                continue
-            if i.is_ui_element():
-                uis.add(i)
-            else:
-                i.predraw()
-                i.draw()
-                i.postdraw()
-
-        if ground is not None: # Why? so it renders ontop of everything
-            ground.predraw()
-            ground.draw()
-            ground.postdraw()
-
-        if lvlman is not None:
-            lvlman.predraw()
-            lvlman.draw()
-            lvlman.postdraw()
-
+        game.update_cam()
+
+        drawn = 0
+        for i in game.visible_in_layers(RenderLayer.WORLD, RenderLayer.EDITOR_OVERLAY):
+            i.predraw()
+            i.draw()
+            i.postdraw()
+            drawn += 1
+        overlay.mark("world draw")
         
         game._call_deferred()
+        overlay.mark("deferred")
         
         end_mode_2d()
+        if world_target is not None:
+            world_target.end()
 
-        for i in uis:
+        for i in game.visible_in_layers(RenderLayer.SCREEN_UI, RenderLayer.SCREEN_UI):
             i.ui_draw()
         
-        if player is not None:
-            win = game.find_by_tag("Win")
-            if win is not None:
-                distance = abs(win.position.x - player.position.x)
-                percent = 100 - (distance / (win.position.x + 400)) * 100 # I added 400 cause the player starts -400 units back.
-                
-                text = f"{round(percent, 1)}%"
-                draw_rectangle(get_screen_width()//2 - 170, 10, int(percent)*3, 20, BLUE)
-                draw_rectangle_lines(get_screen_width()//2 - 170, 10, 300, 20, DARKBLUE)
+        if (percent := game.level_progress()) is not None:
+            draw_progress_bar(percent)
 
-                draw_text(text, get_screen_width()//2 + 150, 10, 24, BLACK)
+        overlay.draw()
+        overlay.mark("ui")
 
         end_drawing()
+        overlay.mark("end_drawing")
+        overlay.end(len(visible), drawn)
+        game.frame_presented(game.level, game.frame - game.level_frame)
+        if first_frame:
+            first_frame = False
+            print(f"Cold start: {(time.perf_counter() - STARTED) * 1000:.0f} ms to the first frame, {Assets.opens} asset files opened ({Assets.mode()})")
+
+        frame_stats.tick()
+        if AllocStats.ENABLED:
+            AllocStats.end_frame(game.level)
+        if frame.has_edge():
+            frame_stats.latency(frame.time)
         
         delta = get_time() - last_frame
         last_frame = get_time()
+
+    if sim is not None:
+        sim.stop()
+        sim.join()
+        print(sim.stats.summary())
+    print(frame_stats.summary())
+    print(LevelCache.summary())
+    if AllocStats.ENABLED:
+        print(AllocStats.summary())
+    print(f"Assets: {Assets.opens} files opened ({Assets.mode()})")
+
+    if world_target is not None:
+        world_target.unload()
     
     close_window()
     win_inited = False
 
     game.reset()
     BackgroundLoader.clear_cache()
+    LevelThumbnails.shutdown()
+    LevelPrefetcher.shutdown()
 
 if __name__ == "__main__":
     try:
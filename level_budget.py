@@ -0,0 +1,51 @@
+"""
+Estimates what a level costs to run, so problems show up before it's published (see LevelBudget in geo.py).
+
+    python level_budget.py <level files, folders or Level classes ...>
+
+    python level_budget.py levels/hard.level
+    python level_budget.py HardLevel custom_levels
+
+For every screen of the level it prints the most objects visible at once, the most collision candidates
+along the player's path and the estimated logic & draw list time of the slowest tick, followed by the
+hotspots: ticks over budget, long stretches of stacked spikes and overlapping triggers.
+"""
+
+import os
+import sys
+
+import geo
+from geo import BinaryLevel, Level, LevelBudget
+from convert_levels import find_files
+
+def find_levels(args):
+    levels = []
+    for arg in args:
+        if os.path.exists(arg):
+            for path in find_files([arg], ".level") + find_files([arg], BinaryLevel.EXTENSION):
+                levels.append((path, Level.from_file(path)))
+            continue
+        cls = getattr(geo, arg, None)
+        if not (isinstance(cls, type) and issubclass(cls, Level)):
+            print(f"'{arg}' isn't a level file, folder or Level class")
+            sys.exit(1)
+        levels.append((arg, cls()))
+    return levels
+
+def main():
+    if len(sys.argv) < 2:
+        print(__doc__)
+        sys.exit(1)
+
+    costs = {}
+    for source, level in find_levels(sys.argv[1:]):
+        # classes that were already timed are reused so every level is compared with the same numbers
+        missing = [o for o in level.get() if type(o).__name__ not in costs]
+        costs.update(LevelBudget.measure(missing))
+        windows, hotspots, _ = LevelBudget.analyze(level, costs)
+        print(f"{level.name} ({source})")
+        print(LevelBudget.format(windows, hotspots))
+        print()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+"""
+Merges tiles & removes duplicate objects from levels without changing how they play (see LevelOptimizer in geo.py).
+
+    python optimize_level.py [--write] [files or folders ...]
+
+With no paths it looks at everything in levels/ and custom_levels/. For each level it prints how many
+objects were removed and the average time of a tick (logic & draw list) before and after, measured by moving
+the player through the whole level. Files are only changed with --write.
+"""
+
+import os
+import sys
+import time
+
+from pyray import Camera2D, Vector2
+
+import geo
+from geo import BinaryLevel, Game, Level, LevelOptimizer, LevelParser, LevelStream, RenderLayer
+from convert_levels import DEFAULT_FOLDERS, find_files, write_text
+
+STEP = 50 # how far the player moves between measured ticks
+RUNS = 3
+
+def tick_time(name, specs):
+    # average seconds per tick with the player swept through the level, best of RUNS
+    best = None
+    for _ in range(RUNS):
+        geo.game = g = Game()
+        g.camera = Camera2D(Vector2(0, 0), Vector2(0, 0), 0, 1)
+        g.set_level(Level(name, lambda: LevelParser.instantiate(specs)))
+        player = g.get_player()
+        player.halted = True # no dying or moving by itself, everything still collides with it
+
+        start_x = player.position.x
+        win = g.find_by_tag("Win")
+        end_x = level_end(specs, start_x) if win is None else win.position.x
+
+        ticks = 0
+        total = 0
+        x = start_x
+        while x <= end_x:
+            player.position.x = x
+            g.camera.target = Vector2(x + 200, 0)
+            start = time.perf_counter()
+            g.run_logic(g.build_visible())
+            cmds = []
+            for i in g.visible_in_layers(RenderLayer.WORLD, RenderLayer.EDITOR_OVERLAY):
+                i.draw_cmds(cmds)
+            total += time.perf_counter() - start
+            ticks += 1
+            x += STEP
+        g.reset()
+
+        t = total / max(ticks, 1)
+        best = t if best is None else min(best, t)
+    return best
+
+def level_end(specs, default):
+    ends = [e[1] for e in map(LevelStream.extent, specs) if e is not None]
+    return max(ends, default=default)
+
+def main():
+    write = "--write" in sys.argv
+    paths = [a for a in sys.argv[1:] if not a.startswith("--")]
+    files = find_files(paths or DEFAULT_FOLDERS, ".level") + find_files(paths or DEFAULT_FOLDERS, BinaryLevel.EXTENSION)
+    if not files:
+        print("No levels found.")
+        return
+
+    print(f"{'file':<40}{'objects':>8}{'after':>8}{'removed':>9}{'tick before':>13}{'tick after':>12}")
+    for path in files:
+        name, specs = Level.read_file(path)
+        optimized, removed = LevelOptimizer.optimize(specs)
+        before = tick_time(name, specs)
+        after = tick_time(name, optimized)
+        print(
+            f"{path:<40}{len(specs):>8}{len(optimized):>8}{len(specs) - len(optimized):>9}"
+            f"{before * 1000:>11.3f}ms{after * 1000:>10.3f}ms  "
+            + ", ".join(f"{n} {t}" for t, n in sorted(removed.items()))
+        )
+
+        if write and removed:
+            if BinaryLevel.is_binary(path):
+                BinaryLevel.write(path, name, optimized)
+            else:
+                write_text(path, name, optimized)
+
+    if not write:
+        print("Nothing was written, run with --write to save the optimized levels.")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,52 @@
+"""
+Writes generated levels of any size for scaling tests (see StressLevel in geo.py).
+
+    python stress_level.py [--count=100000] [--density=250] [--mix=Tile:40,Spike:25,...] [--seed=0] [--binary] [out]
+
+Makes a level with --count objects (besides the player, ground & win wall), --density of them on every screen,
+so the level is count / density screens long. The mix picks how often each kind comes up, the kinds are
+Tile, Spike, Slope, Orb, Pad, Portal & Trigger. The same options & seed always make the same level.
+It's written to custom_levels/stress_<count>.level (or .glevel with --binary) unless a path is given.
+In code, StressLevel(count, density, mix) is a Level and StressLevel.objects(...) the list of objects.
+"""
+
+import os
+import sys
+import time
+
+from geo import BinaryLevel, StressLevel, arg_value
+from convert_levels import write_text
+
+def main():
+    if "--help" in sys.argv:
+        print(__doc__)
+        return
+
+    count = int(arg_value("--count", StressLevel.COUNT))
+    density = int(arg_value("--density", StressLevel.DENSITY))
+    seed = int(arg_value("--seed", 0))
+    mix = arg_value("--mix")
+    try:
+        mix = None if mix is None else StressLevel.parse_mix(mix)
+    except ValueError as e:
+        print(f"--mix: {e}")
+        sys.exit(1)
+
+    paths = [a for a in sys.argv[1:] if not a.startswith("--")]
+    extension = BinaryLevel.EXTENSION if "--binary" in sys.argv else ".level"
+    path = paths[0] if paths else os.path.join("custom_levels", f"stress_{count}{extension}")
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+
+    start = time.perf_counter()
+    specs = StressLevel.generate(count, density, mix, seed)
+    name = f"Stress Level {count}"
+    if BinaryLevel.is_binary(path):
+        BinaryLevel.write(path, name, specs)
+    else:
+        write_text(path, name, specs)
+
+    screens = -(-count // density)
+    print(f"{path}: {len(specs)} objects over {screens} screens, {os.path.getsize(path) / 1024:.0f} KiB in {time.perf_counter() - start:.2f}s")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,34 @@
+"""
+Run from the repo root with: python -m pytest tests
+"""
+
+import pytest
+
+from geo import BinaryLevel, Level, LevelWatcher
+
+def test_truncated_binary_level_raises_value_error():
+    data = BinaryLevel.dump("cut off", Level.read_file("levels/ship.level")[1])
+    (index_at,) = BinaryLevel.FOOTER.unpack_from(data, len(data) - BinaryLevel.FOOTER.size)
+    for n in range(0, index_at, 7): # parse() doesn't need the chunk index after the objects
+        with pytest.raises(ValueError):
+            BinaryLevel.parse(data[:n], "cut.glevel")
+
+def test_watcher_skips_half_written_file(tmp_path, capsys):
+    specs = Level.read_file("levels/ship.level")[1]
+    path = str(tmp_path / "watched.glevel")
+    BinaryLevel.write(path, "watched", specs)
+    watcher = LevelWatcher(path)
+
+    data = BinaryLevel.dump("watched", specs[:-1])
+    with open(path, "wb") as f:
+        f.write(data[:len(data) // 2])
+    watcher.next_poll = 0
+    assert watcher.poll() is None
+    assert "Couldn't reload" in capsys.readouterr().err
+
+    # once it's all written the change is picked up
+    with open(path, "wb") as f:
+        f.write(data)
+    watcher.next_poll = 0
+    removed, added = watcher.poll()
+    assert removed == [specs[-1]] and added == []